@@ -0,0 +1,92 @@
+"""Benchmark of cache value compression, throughput versus compression ratio.
+
+Payloads are synthetic match-v5 shaped responses unless a directory of JSON files
+(e.g. saved match-v5 responses) is provided.
+
+Usage: `python -m benchmarks.compression [DIRECTORY]`
+"""
+
+import json
+import pathlib
+import random
+import sys
+import time
+
+from pulsefire.caches import ZlibCodec, ZstdCodec
+
+
+def synthetic_match(rng: random.Random) -> dict:
+    champions = ["Yone", "Yasuo", "Ahri", "Lux", "Jinx", "Thresh", "LeeSin", "Ezreal", "Kaisa", "Sett"]
+    return {
+        "metadata": {
+            "dataVersion": "2",
+            "matchId": f"NA1_{rng.randrange(10**10)}",
+            "participants": [rng.randbytes(39).hex() for _ in range(10)],
+        },
+        "info": {
+            "gameCreation": rng.randrange(10**12, 10**13),
+            "gameDuration": rng.randrange(900, 2700),
+            "gameMode": "CLASSIC",
+            "gameVersion": "14.20.623.1234",
+            "participants": [
+                {
+                    "championName": rng.choice(champions),
+                    "championId": rng.randrange(1, 999),
+                    "puuid": rng.randbytes(39).hex(),
+                    "summonerName": f"Summoner{rng.randrange(10**6)}",
+                    "challenges": {f"challenge{i}": rng.random() * 100 for i in range(120)},
+                    "perks": {"styles": [{"selections": [{"perk": rng.randrange(8000, 9000), "var1": rng.randrange(1000)} for _ in range(4)]}]},
+                    **{f"stat{i}": rng.randrange(10**5) for i in range(100)},
+                    **{f"item{i}": rng.randrange(1000, 8000) for i in range(7)},
+                    "win": rng.random() > 0.5,
+                }
+                for _ in range(10)
+            ],
+        },
+    }
+
+
+def load_payloads(directory: str | None, n: int = 50) -> list[bytes]:
+    if directory:
+        return [path.read_bytes() for path in sorted(pathlib.Path(directory).glob("*.json"))]
+    rng = random.Random(0)
+    return [json.dumps(synthetic_match(rng)).encode() for _ in range(n)]
+
+
+def bench(name: str, codec, payloads: list[bytes]):
+    start = time.perf_counter()
+    compressed = [codec.compress(payload) for payload in payloads]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in compressed:
+        codec.decompress(data)
+    decompress_time = time.perf_counter() - start
+    raw_size = sum(map(len, payloads))
+    ratio = raw_size / sum(map(len, compressed))
+    print(
+        f"{name:<22} ratio {ratio:6.2f}x  "
+        f"compress {raw_size / compress_time / 1e6:8.1f} MB/s  "
+        f"decompress {raw_size / decompress_time / 1e6:8.1f} MB/s"
+    )
+
+
+def main():
+    payloads = load_payloads(sys.argv[1] if len(sys.argv) > 1 else None)
+    samples, payloads = payloads[:len(payloads) // 5], payloads[len(payloads) // 5:]
+    print(f"{len(payloads)} payloads, {sum(map(len, payloads)) / len(payloads) / 1024:.1f} KiB average")
+    for level in (1, 6, 9):
+        bench(f"zlib-{level}", ZlibCodec(level), payloads)
+    bench("zlib-6+dict", ZlibCodec(6, dictionary=b"".join(samples)[-32768:]), payloads)
+    try:
+        import zstandard
+    except ImportError:
+        print("zstandard not installed, skipping zstd")
+        return
+    for level in (1, 3, 9, 19):
+        bench(f"zstd-{level}", ZstdCodec(level), payloads)
+    dictionary = zstandard.train_dictionary(112640, samples).as_bytes()
+    bench("zstd-3+dict", ZstdCodec(3, dictionary=dictionary), payloads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark of cache eviction policies, hit rates of replayed access traces.
+
+Traces are files of one cache key per line (e.g. `cache_middleware` keys logged in production).
+Without trace files, a synthetic trace is replayed: Zipf distributed accesses of static data and
+summoner lookups, interrupted by one-off crawls through old matches.
+
+Usage: `python -m benchmarks.eviction [TRACE ...]`
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from pulsefire.caches import LFUPolicy, MemoryCache, WTinyLFUPolicy
+
+
+def synthetic_trace(n: int = 200_000, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    hot = [f"GET https://na1.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{i}" for i in range(5000)]
+    hot += [f"GET https://raw.communitydragon.org/14.20/plugins/rcp-be-lol-game-data/global/default/v1/champions/{i}.json" for i in range(170)]
+    weights = [1 / (rank + 1) for rank in range(len(hot))]
+    trace = []
+    while len(trace) < n:
+        trace.extend(rng.choices(hot, weights, k=5000))
+        if rng.random() < 0.3:
+            start = rng.randrange(10**9)
+            trace.extend(f"GET https://americas.api.riotgames.com/lol/match/v5/matches/NA1_{start + i}" for i in range(3000))
+    return trace[:n]
+
+
+def load_traces(paths: list[str]) -> dict[str, list[str]]:
+    if not paths:
+        return {"synthetic": synthetic_trace()}
+    traces = {}
+    for path in paths:
+        with open(path) as file:
+            traces[path] = [line.rstrip("\n") for line in file if line.strip()]
+    return traces
+
+
+async def replay(trace: list[str], cache: MemoryCache) -> float:
+    hits = 0
+    for key in trace:
+        try:
+            await cache.get(key)
+            hits += 1
+        except KeyError:
+            await cache.set(key, None, float("inf"))
+    return hits / len(trace)
+
+
+async def main(paths: list[str]):
+    policies = {"LRU": lambda: None, "LFU": LFUPolicy, "W-TinyLFU": WTinyLFUPolicy}
+    for name, trace in load_traces(paths).items():
+        print(f"{name}: {len(trace)} accesses, {len(set(trace))} keys")
+        for capacity in (250, 1000, 2500):
+            results = []
+            for policy_name, policy in policies.items():
+                started = time.perf_counter()
+                hit_rate = await replay(trace, MemoryCache(max_entries=capacity, policy=policy()))
+                elapsed = time.perf_counter() - started
+                results.append(f"{policy_name} {hit_rate:6.2%} ({len(trace) / elapsed / 1e3:.0f}K ops/s)")
+            print(f"  capacity {capacity:>5}: " + " | ".join(results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""Benchmark of `Invocation` construction throughput and memory footprint.
+
+Compares the slotted invocation with lazy UIDs against the previous implementation,
+which generated a random UID on construction and stored attributes in `__dict__`.
+
+Usage: `python -m benchmarks.invocation`
+"""
+
+from base64 import b64encode
+import os
+import time
+import tracemalloc
+
+from pulsefire.invocation import Invocation
+
+
+class LegacyInvocation:
+    """Invocation prior to slots and lazy UIDs."""
+
+    def __init__(self, method, urlformat, params, session=None, *, invoker=None, uid=None) -> None:
+        self.uid = uid or b64encode(os.urandom(12)).decode("utf-8")
+        self.method = method
+        self.urlformat = urlformat
+        self.params = params
+        self.session = session
+        self.invoker = invoker
+
+
+URLFORMAT = "https://{region}.api.riotgames.com/lol/match/v5/matches/{id}"
+
+
+def bench_throughput(invocation_cls: type, n: int) -> float:
+    params = {"region": "americas", "id": "NA1_0000000000", "queries": {}, "headers": {}}
+    start = time.perf_counter()
+    for _ in range(n):
+        invocation_cls("GET", URLFORMAT, params)
+    return n / (time.perf_counter() - start)
+
+
+def bench_memory(invocation_cls: type, n: int) -> float:
+    params = {"region": "americas", "id": "NA1_0000000000", "queries": {}, "headers": {}}
+    tracemalloc.start()
+    invocations = [invocation_cls("GET", URLFORMAT, params) for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del invocations
+    return size / n
+
+
+def main(n: int = 500_000):
+    for invocation_cls in (LegacyInvocation, Invocation):
+        throughput = bench_throughput(invocation_cls, n)
+        memory = bench_memory(invocation_cls, n // 10)
+        print(f"{invocation_cls.__name__:<18} {throughput / 1e6:6.2f} M/s {memory:8.1f} B/invocation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Microbenchmark of `BaseClient.invoke` per-call overhead.
+
+Compares the frame introspection based invoke against the precompiled invocation plans,
+the middleware chain is short-circuited so that no HTTP request is performed.
+
+Usage: `python -m benchmarks.invoke`
+"""
+
+import asyncio
+import itertools
+import sys
+import time
+
+from pulsefire.clients import RiotAPIClient
+from pulsefire.invocation import Invocation
+
+
+def short_circuit_middleware():
+    def constructor(next):
+        async def middleware(invocation: Invocation):
+            return invocation
+        return middleware
+    return constructor
+
+
+class LegacyRiotAPIClient(RiotAPIClient):
+    """Client using the invoke implementation prior to invocation plans."""
+
+    async def invoke(self, method, path_or_url):
+        params = {}
+        for key, value in itertools.chain(self.default_params.items(), sys._getframe(1).f_locals.items()):
+            if key != "self" and value != ...:
+                params[key] = value
+        params["queries"] = {**self.default_queries, **params.get("queries", {})}
+        params["headers"] = {**self.default_headers, **params.get("headers", {})}
+        invoker = getattr(self, sys._getframe(1).f_code.co_name, None)
+        invocation = Invocation(method, self.base_url + path_or_url, params, self.session, invoker=invoker)
+        return await self.middleware_begin(invocation)
+
+
+async def bench(client: RiotAPIClient, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        await client.get_lol_match_v5_match_ids_by_puuid(region="americas", puuid="puuid")
+    return (time.perf_counter() - start) / n
+
+
+async def main(n: int = 200_000):
+    for client_cls in (LegacyRiotAPIClient, RiotAPIClient):
+        client = client_cls(middlewares=[short_circuit_middleware()])
+        await bench(client, n // 10)
+        per_call = await bench(client, n)
+        print(f"{client_cls.__name__:<24} {per_call * 1e6:8.3f} us/call")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""Microbenchmark of local `RiotAPIRateLimiter` throughput per core.
+
+Compares the array-backed bucket index against the tuple keyed index it replaced. Invocations
+are spread across regions and endpoints with limits high enough to never wait, so that only the
+bookkeeping of `acquire` and `synchronize` is measured: "steady" only acquires within known windows,
+"pinging" uses zero-second windows so that every acquire opens a new window and synchronizes.
+
+Usage: `python -m benchmarks.ratelimiter`
+"""
+
+import asyncio
+import collections
+import itertools
+import time
+
+from pulsefire.invocation import Invocation
+from pulsefire.ratelimiters import RiotAPIRateLimiter
+
+
+class LegacyRiotAPIRateLimiter(RiotAPIRateLimiter):
+    """Rate limiter using the tuple keyed index prior to the array-backed buckets."""
+
+    _index = collections.defaultdict(lambda: (0, 0, 0, 0, 0))
+
+    async def acquire(self, invocation):
+        wait_for = 0
+        pinging_targets = []
+        requesting_targets = []
+        request_time = time.time()
+        targets = self._targets(invocation)
+        for target in targets:
+            count, limit, expire, latency, pinged = self._index[target]
+            pinging = pinged and request_time - pinged < 10
+            if pinging:
+                wait_for = max(wait_for, 0.1)
+            elif request_time > expire:
+                pinging_targets.append(target)
+            elif request_time > expire - latency * 1.1 + 0.01 or count >= limit:
+                wait_for = max(wait_for, expire - request_time)
+            else:
+                requesting_targets.append(target)
+        if wait_for <= 0:
+            if pinging_targets:
+                self._track_syncs[invocation.uid] = (request_time, pinging_targets)
+                for pinging_target in pinging_targets:
+                    self._index[pinging_target] = (0, 0, 0, 0, request_time)
+                wait_for = -1
+            for requesting_target in requesting_targets:
+                count, *values = self._index[requesting_target]
+                self._index[requesting_target] = (count + 1, *values)
+        return wait_for
+
+    async def synchronize(self, invocation, headers):
+        response_time = time.time()
+        request_time, pinging_targets = self._track_syncs.pop(invocation.uid, [None, None])
+        if request_time is None:
+            return
+        header_limits = {
+            "app": [[int(v) for v in t.split(':')] for t in headers["X-App-Rate-Limit"].split(',')],
+            "method": [[int(v) for v in t.split(':')] for t in headers["X-Method-Rate-Limit"].split(',')],
+        }
+        header_counts = {
+            "app": [[int(v) for v in t.split(':')] for t in headers["X-App-Rate-Limit-Count"].split(',')],
+            "method": [[int(v) for v in t.split(':')] for t in headers["X-Method-Rate-Limit-Count"].split(',')],
+        }
+        for scope, idx, *subscopes in pinging_targets:
+            if idx >= len(header_limits[scope]):
+                self._index[(scope, idx, *subscopes)] = (0, 10**10, response_time + 3600, 0, 0)
+                self._wake((scope, idx, *subscopes), 10**10)
+                continue
+            self._index[(scope, idx, *subscopes)] = (
+                header_counts[scope][idx][0],
+                header_limits[scope][idx][0],
+                header_limits[scope][idx][1] + response_time,
+                response_time - request_time,
+                0
+            )
+            self._wake((scope, idx, *subscopes), header_limits[scope][idx][0] - header_counts[scope][idx][0])
+
+    def _targets(self, invocation):
+        region = invocation.params.get("region", "")
+        return [
+            ("app", 0, region, invocation.method),
+            ("app", 1, region, invocation.method),
+            ("method", 0, region, invocation.method, invocation.urlformat),
+            ("method", 1, region, invocation.method, invocation.urlformat),
+        ]
+
+    def _wake(self, target, n, deadline=False):
+        pass # Nothing waits in the benchmark
+
+
+def headers(window: int) -> dict[str, str]:
+    return {
+        "X-App-Rate-Limit": f"10000000:{window},100000000:{window}",
+        "X-App-Rate-Limit-Count": f"1:{window},1:{window}",
+        "X-Method-Rate-Limit": f"10000000:{window}",
+        "X-Method-Rate-Limit-Count": f"1:{window}",
+    }
+
+
+async def measure(rate_limiter: RiotAPIRateLimiter, invocations: list[Invocation], window: int, n: int) -> float:
+    response_headers = headers(window)
+    LegacyRiotAPIRateLimiter._index.clear()
+    for invocation in invocations: # Synchronize all buckets before measuring
+        if await rate_limiter.acquire(invocation) == -1:
+            await rate_limiter.synchronize(invocation, response_headers)
+    started = time.perf_counter()
+    for invocation in itertools.islice(itertools.cycle(invocations), n):
+        if await rate_limiter.acquire(invocation) == -1:
+            await rate_limiter.synchronize(invocation, response_headers)
+    return n / (time.perf_counter() - started)
+
+
+async def main(n: int = 200_000):
+    regions = ["na1", "euw1", "kr", "br1", "americas", "europe", "asia"]
+    urlformats = [f"https://{{region}}.api.riotgames.com/lol/endpoint-{i}/{{id}}" for i in range(20)]
+    invocations = [
+        Invocation("GET", urlformat, {"region": region, "id": 1})
+        for region, urlformat in itertools.product(regions, urlformats)
+    ]
+    for scenario, window in (("steady", 3600), ("pinging", 0)):
+        results = {}
+        for name, cls in (("legacy", LegacyRiotAPIRateLimiter), ("buckets", RiotAPIRateLimiter)):
+            results[name] = await measure(cls(shared=False), invocations, window, n)
+            print(f"{scenario:<8} {name:<8} {results[name] / 1e3:8.0f}K ops/s {1e6 / results[name]:6.2f}us/op")
+        print(f"{scenario:<8} speedup  {results['buckets'] / results['legacy']:7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,17 +3,313 @@
 This module contains cache implementations for pulsefire.
 """
 
-from typing import Any, Callable
+from typing import Any, Callable, NoReturn
 import abc
+import asyncio
+import bisect
+import collections
+import contextlib
+import heapq
+import itertools
+import json
+import logging
+import concurrent.futures
 import math
+import mmap
+import os
+import queue
+import random
+import sqlite3
+import struct
+import tempfile
 import time
 import pickle
+import sys
+import threading
+import zlib
+
+import aiohttp
+import multidict
+import yarl
 
 from .functools import sync_to_async
 from .invocation import Invocation
 
 
-type CacheRule = tuple[Callable[[Invocation], bool], float]
+type CacheTTL = float | Callable[[Invocation], float]
+type CacheRule = tuple[Callable[[Invocation], bool], CacheTTL] | tuple[Callable[[Invocation], bool], CacheTTL, float]
+
+
+LOGGER = logging.getLogger("pulsefire.caches")
+
+
+class CachedResponse:
+    """Raw HTTP response stored in cache.
+
+    Stand-in of `aiohttp.ClientResponse` for deserialization middlewares, caches store the raw
+    response body and deserialization only happens when the response is read.
+    """
+
+    __slots__ = ("method", "url", "status", "reason", "headers", "body")
+
+    method: str
+    """HTTP method of the request."""
+    url: str
+    """URL of the request."""
+    status: int
+    """HTTP status."""
+    reason: str | None
+    """HTTP status reason."""
+    headers: multidict.CIMultiDict[str]
+    """Response headers."""
+    body: bytes
+    """Raw response body."""
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        status: int,
+        reason: str | None,
+        headers: multidict.CIMultiDict[str],
+        body: bytes,
+    ) -> None:
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} status={self.status} method={self.method} url={self.url}>"
+
+    def __getstate__(self):
+        return (self.method, self.url, self.status, self.reason, dict(self.headers), self.body)
+
+    def __setstate__(self, state) -> None:
+        self.method, self.url, self.status, self.reason, headers, self.body = state
+        self.headers = multidict.CIMultiDict(headers)
+
+    @classmethod
+    async def from_response(cls, response: "aiohttp.ClientResponse | CachedResponse") -> "CachedResponse":
+        """Read an HTTP response into a cached response."""
+        if isinstance(response, CachedResponse):
+            return response
+        return cls(
+            response.method,
+            str(response.url),
+            response.status,
+            response.reason,
+            multidict.CIMultiDict(response.headers),
+            await response.read(),
+        )
+
+    @property
+    def ok(self) -> bool:
+        """True if HTTP status is lower than 400."""
+        return self.status < 400
+
+    def raise_for_status(self) -> None:
+        """Raise `aiohttp.ClientResponseError` if HTTP status is 400 or higher."""
+        if self.ok:
+            return
+        url = yarl.URL(self.url)
+        raise aiohttp.ClientResponseError(
+            aiohttp.RequestInfo(url, self.method, multidict.CIMultiDictProxy(multidict.CIMultiDict()), url),
+            (),
+            status=self.status,
+            message=self.reason or "",
+            headers=self.headers,
+        )
+
+    async def read(self) -> bytes:
+        """Read response body."""
+        return self.body
+
+    async def text(self, encoding: str | None = None) -> str:
+        """Read response body and decode it as text."""
+        return self.body.decode(encoding or "utf-8")
+
+    async def json(
+        self,
+        *,
+        encoding: str | None = None,
+        loads: Callable[[str | bytes | bytearray], Any] = json.loads,
+        content_type: str | None = "application/json",
+    ) -> Any:
+        """Read response body and deserialize it as JSON.
+
+        Raises:
+            aiohttp.ContentTypeError: When `content_type` is set and does not match the response.
+        """
+        if content_type and content_type not in self.headers.get("Content-Type", "").lower():
+            url = yarl.URL(self.url)
+            raise aiohttp.ContentTypeError(
+                aiohttp.RequestInfo(url, self.method, multidict.CIMultiDictProxy(multidict.CIMultiDict()), url),
+                (),
+                status=self.status,
+                message=f"Attempt to decode JSON with unexpected mimetype: {self.headers.get('Content-Type', '')}",
+                headers=self.headers,
+            )
+        if not self.body.strip():
+            return None
+        return loads(self.body.decode(encoding or "utf-8"))
+
+
+class ZlibCodec:
+    """Zlib codec for compressing cache values.
+
+    Example:
+    ```python
+    ZlibCodec() # Level 6
+    ZlibCodec(1) # Faster, lower ratio
+    ZlibCodec(6, dictionary=open("samples.json", "rb").read()) # Preset dictionary (last 32 KiB used)
+    ```
+
+    Parameters:
+        level: Compression level (0-9).
+        dictionary: Preset dictionary, usually sample payloads of the cached responses.
+    """
+
+    def __init__(self, level: int = 6, *, dictionary: bytes | None = None) -> None:
+        self.level = level
+        self.dictionary = dictionary
+
+    def compress(self, data: bytes) -> bytes:
+        if not self.dictionary:
+            return zlib.compress(data, self.level)
+        compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if not self.dictionary:
+            return zlib.decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+class ZstdCodec:
+    """Zstandard codec for compressing cache values.
+
+    Requires `zstandard` installed.
+
+    Example:
+    ```python
+    ZstdCodec() # Level 3
+    ZstdCodec(10) # Slower, higher ratio
+
+    # Dictionary trained on sample payloads
+    samples = [orjson.dumps(match) for match in matches]
+    ZstdCodec(3, dictionary=zstandard.train_dictionary(112640, samples).as_bytes())
+    ```
+
+    Parameters:
+        level: Compression level (1-22).
+        dictionary: Dictionary, usually trained on sample payloads of the cached responses.
+    """
+
+    def __init__(self, level: int = 3, *, dictionary: bytes | None = None) -> None:
+        import zstandard
+        self.level = level
+        self.dictionary = dictionary
+        self._zstandard = zstandard
+        self._local = threading.local()
+
+    def _contexts(self):
+        local = self._local
+        if not hasattr(local, "compressor"):
+            zstandard = self._zstandard
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            local.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return local
+
+    def compress(self, data: bytes) -> bytes:
+        return self._contexts().compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._contexts().decompressor.decompress(data)
+
+
+_COMPRESSED_MAGIC = b"\x00pz\x01"
+
+
+def _compress(codec, threshold: int, data: Any) -> Any:
+    if codec is None or not isinstance(data, bytes) or len(data) < threshold:
+        return data
+    return _COMPRESSED_MAGIC + codec.compress(data)
+
+
+def _decompress(codec, data: Any) -> Any:
+    if codec is None or not isinstance(data, bytes) or not data.startswith(_COMPRESSED_MAGIC):
+        return data
+    return codec.decompress(data[len(_COMPRESSED_MAGIC):])
+
+
+def _pack_entries(entries: dict[str, tuple[bytes, float | None]]) -> bytes:
+    chunks = []
+    for key, (value, ttl) in entries.items():
+        encoded_key = key.encode("utf-8")
+        chunks.append(struct.pack("!IId", len(encoded_key), len(value), math.nan if ttl is None else ttl))
+        chunks.append(encoded_key)
+        chunks.append(value)
+    return b"".join(chunks)
+
+
+def _unpack_entries(data: bytes) -> dict[str, tuple[bytes, float | None]]:
+    entries = {}
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        key_size, value_size, ttl = struct.unpack_from("!IId", data, offset)
+        offset += 16
+        key = bytes(view[offset:offset + key_size]).decode("utf-8")
+        offset += key_size
+        entries[key] = (bytes(view[offset:offset + value_size]), None if math.isnan(ttl) else ttl)
+        offset += value_size
+    return entries
+
+
+_ESTIMATE_SIZE_ITEMS = 128
+_ESTIMATE_SIZE_SAMPLES = 4
+
+
+def estimate_size(value: Any) -> int:
+    """Estimate the size of a cache value in bytes.
+
+    Bytes, strings and cached responses are measured by length of raw response bodies, in constant
+    time. Other values, e.g. decoded JSON, approximate their JSON length by sampling: containers
+    measure their first 4 items and scale by their length, measuring at most 128 items per value
+    regardless of its size (~0.1ms). Heterogeneous containers are estimated less accurately, pass a
+    `sizer` if values of known type can be measured exactly or cheaper.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    if isinstance(value, CachedResponse):
+        return len(value.body)
+    budget = _ESTIMATE_SIZE_ITEMS
+
+    def measure(item: Any) -> int:
+        nonlocal budget
+        budget -= 1
+        if isinstance(item, (str, bytes, bytearray)):
+            return len(item) + 2
+        if item is None or isinstance(item, (bool, int, float)):
+            return 8
+        if isinstance(item, dict):
+            items = item.items() # Items measure as key-value pairs
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            items = item
+        else:
+            return sys.getsizeof(item)
+        sample_count = min(len(item), _ESTIMATE_SIZE_SAMPLES, max(budget, 0))
+        samples = [measure(sample) for sample in itertools.islice(items, sample_count)]
+        if not samples:
+            return 2 + 8 * len(item)
+        return 2 + len(item) * (sum(samples) // len(samples) + 1)
+
+    return measure(value)
 
 
 class BaseCache(abc.ABC):
@@ -34,43 +330,507 @@ class BaseCache(abc.ABC):
     async def clear(self) -> None:
         """Clear all values in cache."""
 
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float | None]:
+        """Get a value and its remaining TTL from cache, the TTL is None if unknown.
+
+        Override on caches exposing TTLs, the default implementation returns the value of `get`
+        with an unknown TTL.
+        """
+        return await self.get(key), None
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        """Get values from cache, missing keys are omitted from the result."""
+        values = {}
+        for key in keys:
+            try:
+                values[key] = await self.get(key)
+            except KeyError:
+                pass
+        return values
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float | None]]:
+        """Get values and their remaining TTLs from cache, missing keys are omitted from the result."""
+        entries = {}
+        for key in keys:
+            try:
+                entries[key] = await self.get_with_ttl(key)
+            except KeyError:
+                pass
+        return entries
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        """Set values to cache."""
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete a value from cache, missing keys are ignored.
+
+        Caches implementing only `get`, `set` and `clear` prior to v2.1 must implement this method,
+        raising `NotImplementedError` if deletion is not supported.
+        """
+
+    async def delete_many(self, keys: list[str]) -> None:
+        """Delete values from cache, missing keys are ignored."""
+        for key in keys:
+            await self.delete(key)
+
+    def serve(self, host="127.0.0.1", port=12228, *, secret: str | None = None) -> NoReturn:
+        """Serve this cache stand-alone for sharing across runtimes, use `ProxyCache` to connect.
+
+        Values are stored as serialized by the proxy caches and never deserialized by the server.
+
+        Example:
+        ```python
+        MemoryCache(max_bytes=4 * 1024**3).serve() # Served at 127.0.0.1:12228
+        MemoryCache().serve(port=<PORT>) # Served at 127.0.0.1:<PORT>
+        MemoryCache().serve("0.0.0.0", 12228) # Served at 0.0.0.0:12228 (public)
+        MemoryCache().serve("0.0.0.0", 12228, secret=<SECRET>) # Add authentication
+        ```
+        """
+        from aiohttp import web
+
+        app = web.Application(client_max_size=256 * 1024**2)
+        routes = web.RouteTableDef()
+
+        def is_authenticated(request: web.Request):
+            if not secret:
+                return True
+            request_secret = request.headers.get("Authorization", "Bearer ").removeprefix("Bearer ")
+            return request_secret == secret
+
+        @routes.post("/get_many")
+        async def get_many(request: web.Request) -> web.Response:
+            if not is_authenticated(request):
+                return web.Response(status=401)
+            try:
+                keys = (await request.json())["keys"]
+            except (KeyError, ValueError):
+                return web.Response(status=400)
+            entries = await self.get_many_with_ttl(keys)
+            return web.Response(body=_pack_entries(entries), content_type="application/octet-stream")
+
+        @routes.post("/set_many")
+        async def set_many(request: web.Request) -> web.Response:
+            if not is_authenticated(request):
+                return web.Response(status=401)
+            try:
+                entries = _unpack_entries(await request.read())
+            except (struct.error, UnicodeDecodeError):
+                return web.Response(status=400)
+            by_ttl: dict[float, dict[str, bytes]] = {}
+            for key, (value, ttl) in entries.items():
+                by_ttl.setdefault(ttl, {})[key] = value
+            for ttl, values in by_ttl.items():
+                await self.set_many(values, ttl)
+            return web.Response()
+
+        @routes.post("/delete_many")
+        async def delete_many(request: web.Request) -> web.Response:
+            if not is_authenticated(request):
+                return web.Response(status=401)
+            try:
+                keys = (await request.json())["keys"]
+            except (KeyError, ValueError):
+                return web.Response(status=400)
+            try:
+                await self.delete_many(keys)
+            except NotImplementedError as e:
+                return web.Response(status=501, text=str(e))
+            return web.Response()
+
+        @routes.post("/clear")
+        async def clear(request: web.Request) -> web.Response:
+            if not is_authenticated(request):
+                return web.Response(status=401)
+            await self.clear()
+            return web.Response()
+
+        app.add_routes(routes)
+        web.run_app(app, host=host, port=port)
+
+    @property
+    def bytes_used(self) -> int | None:
+        """Approximate number of bytes used by cached values, None if the cache does not account sizes."""
+        return None
+
+
+class EvictionPolicy(abc.ABC):
+    """Base eviction policy.
+
+    Tracks the keys of a bounded cache and decides which key is evicted when a bound is reached.
+    Policy instances keep per-cache state, do not share them between caches.
+    """
+
+    @abc.abstractmethod
+    def insert(self, key: str) -> None:
+        """Record a key inserted into the cache."""
+
+    @abc.abstractmethod
+    def access(self, key: str) -> None:
+        """Record a cache hit of a key."""
+
+    @abc.abstractmethod
+    def remove(self, key: str) -> None:
+        """Record a key removed from the cache (deleted, expired or evicted)."""
+
+    @abc.abstractmethod
+    def victim(self) -> str:
+        """Return the key to be evicted, the cache is not empty."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Forget all keys."""
+
+
+class LFUPolicy(EvictionPolicy):
+    """Least frequently used eviction policy, ties are broken by least recently used.
+
+    All operations are constant time. Frequencies of evicted keys are forgotten, see `WTinyLFUPolicy`
+    for a policy that remembers them.
+    """
+
+    def __init__(self) -> None:
+        self.frequencies: dict[str, int] = {}
+        self.buckets: dict[int, dict[str, None]] = {}
+        self.min_frequency = 0
+
+    def insert(self, key: str) -> None:
+        self.frequencies[key] = 1
+        self.buckets.setdefault(1, {})[key] = None
+        self.min_frequency = 1
+
+    def access(self, key: str) -> None:
+        frequency = self.frequencies.get(key)
+        if frequency is None:
+            return
+        self._unlink(key, frequency)
+        self.frequencies[key] = frequency + 1
+        self.buckets.setdefault(frequency + 1, {})[key] = None
+
+    def remove(self, key: str) -> None:
+        frequency = self.frequencies.pop(key, None)
+        if frequency is not None:
+            self._unlink(key, frequency)
+
+    def victim(self) -> str:
+        if self.min_frequency not in self.buckets:
+            self.min_frequency = min(self.buckets)
+        return next(iter(self.buckets[self.min_frequency]))
+
+    def clear(self) -> None:
+        self.frequencies.clear()
+        self.buckets.clear()
+        self.min_frequency = 0
+
+    def _unlink(self, key: str, frequency: int) -> None:
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+
+
+_SKETCH_HALVE = bytes(count >> 1 for count in range(256))
+
+
+class _FrequencySketch:
+    """Count-min sketch of 4 rows of 4-bit counters, halved periodically so that old frequencies decay."""
+
+    def __init__(self, width: int = 1024) -> None:
+        self._resize(width)
+
+    def _resize(self, width: int) -> None:
+        self.width = width
+        self.rows = [bytearray(width) for _ in range(4)]
+        self.additions = 0
+
+    def _indexes(self, key: str) -> tuple[int, int, int, int]:
+        # Double hashing, the row indexes are derived from the halves of a single hash
+        key_hash = hash(key)
+        step = (key_hash >> 32) | 1
+        mask = self.width - 1
+        return key_hash & mask, (key_hash + step) & mask, (key_hash + 2 * step) & mask, (key_hash + 3 * step) & mask
+
+    def ensure_capacity(self, size: int) -> None:
+        if size > self.width:
+            self._resize(1 << (size - 1).bit_length())
+
+    def increment(self, key: str) -> None:
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= 10 * self.width:
+            self.rows = [row.translate(_SKETCH_HALVE) for row in self.rows]
+            self.additions //= 2
+
+    def estimate(self, key: str) -> int:
+        a, b, c, d = self._indexes(key)
+        rows = self.rows
+        return min(rows[0][a], rows[1][b], rows[2][c], rows[3][d])
+
+
+class WTinyLFUPolicy(EvictionPolicy):
+    """Window TinyLFU eviction policy, scan resistant.
+
+    New keys enter a small LRU window, then move to a segmented LRU main space (probation and
+    protected). On eviction, the key most recently moved into probation is evicted unless a
+    frequency sketch estimates it to be accessed more often than the least recently used key of
+    probation. Frequencies are remembered after eviction and decay over time, a one-off crawl
+    (e.g. old matches) cannot displace frequently accessed keys (e.g. static data, summoners).
+
+    Example:
+    ```python
+    MemoryCache(max_entries=10000, policy=WTinyLFUPolicy())
+    ```
+
+    Parameters:
+        window_ratio: Share of keys held by the LRU window.
+        protected_ratio: Share of main space keys held by the protected segment.
+    """
+
+    def __init__(self, window_ratio: float = 0.01, protected_ratio: float = 0.8) -> None:
+        self.window_ratio = window_ratio
+        self.protected_ratio = protected_ratio
+        self.window: dict[str, None] = {}
+        self.probation: dict[str, None] = {}
+        self.protected: dict[str, None] = {}
+        self.sketch = _FrequencySketch()
+
+    def insert(self, key: str) -> None:
+        self.sketch.increment(key)
+        self.window[key] = None
+        size = len(self.window) + len(self.probation) + len(self.protected)
+        self.sketch.ensure_capacity(size)
+        window_max = max(1, int(size * self.window_ratio))
+        while len(self.window) > window_max:
+            candidate = next(iter(self.window))
+            del self.window[candidate]
+            self.probation[candidate] = None
+
+    def access(self, key: str) -> None:
+        self.sketch.increment(key)
+        if key in self.window:
+            del self.window[key]
+            self.window[key] = None
+        elif key in self.probation:
+            del self.probation[key]
+            self.protected[key] = None
+            protected_max = max(1, int((len(self.probation) + len(self.protected)) * self.protected_ratio))
+            while len(self.protected) > protected_max:
+                demoted = next(iter(self.protected))
+                del self.protected[demoted]
+                self.probation[demoted] = None
+        elif key in self.protected:
+            del self.protected[key]
+            self.protected[key] = None
+
+    def remove(self, key: str) -> None:
+        for segment in (self.window, self.probation, self.protected):
+            if key in segment:
+                del segment[key]
+                return
+
+    def victim(self) -> str:
+        if len(self.probation) > 1:
+            candidate = next(reversed(self.probation))
+            victim = next(iter(self.probation))
+            return candidate if self.sketch.estimate(candidate) <= self.sketch.estimate(victim) else victim
+        for segment in (self.probation, self.protected, self.window):
+            if segment:
+                return next(iter(segment))
+        raise KeyError("victim from empty policy")
+
+    def clear(self) -> None:
+        self.window.clear()
+        self.probation.clear()
+        self.protected.clear()
+
 
 class MemoryCache(BaseCache):
     """Memory Cache.
 
     This cache lives in-memory, be aware of memory footprint when caching large responses.
 
+    Entries are evicted by least recently used, or by `policy` if provided, when `max_entries` or
+    `max_bytes` is reached. Expired entries are removed incrementally from a deadline-ordered heap,
+    keeping the cost of `get` and `set` constant regardless of cache size. Values are only measured
+    by `sizer` if `max_bytes` is set.
+
     Example:
     ```python
-    MemoryCache()
+    MemoryCache() # Unbounded
+    MemoryCache(max_entries=10000) # Evict LRU beyond 10000 entries
+    MemoryCache(max_bytes=512 * 1024**2) # Evict LRU beyond ~512 MiB of values
+    MemoryCache(max_bytes=512 * 1024**2, sizer=len) # Values are known to be bytes
+    MemoryCache(max_entries=10000, policy=WTinyLFUPolicy()) # Scan resistant eviction
     ```
+
+    Parameters:
+        max_entries: Maximum number of entries, unbounded if None.
+        max_bytes: Maximum approximate bytes of values, unbounded if None.
+        sizer: Function estimating the size of a value in bytes, only used if `max_bytes` is set.
+        policy: Eviction policy instance, least recently used if None.
     """
 
-    cache: dict[str, tuple[Any, float]]
+    cache: collections.OrderedDict[str, tuple[Any, float, int]]
+    """Entries by key (value, expire, size), ordered by least recently used."""
+    max_entries: int | None
+    """Maximum number of entries, unbounded if None."""
+    max_bytes: int | None
+    """Maximum approximate bytes of values, unbounded if None."""
+    sizer: Callable[[Any], int]
+    """Function estimating the size of a value in bytes."""
+    policy: EvictionPolicy | None
+    """Eviction policy instance, least recently used if None."""
 
-    def __init__(self) -> None:
-        self.cache = {}
-        self.last_expired = time.time()
+    expire_batch_size: int = 8
+    """Maximum number of heap deadlines processed per `set`."""
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        sizer: Callable[[Any], int] = estimate_size,
+        policy: EvictionPolicy | None = None,
+    ) -> None:
+        self.cache = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizer = sizer
+        self.policy = policy
+        self._bytes_used = 0
+        self._deadlines: list[tuple[float, str]] = []
+
+    @property
+    def bytes_used(self) -> int | None:
+        return None if self.max_bytes is None else self._bytes_used
 
     async def get[T](self, key: str) -> T:
-        value, expire = self.cache[key]
+        value, expire, _ = self.cache[key]
         if time.time() > expire:
-            self.cache.pop(key, None)
+            self._pop(key)
             raise KeyError(key)
+        self.cache.move_to_end(key)
+        if self.policy is not None:
+            self.policy.access(key)
         return value
 
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float]:
+        value, expire, _ = self.cache[key]
+        ttl = expire - time.time()
+        if ttl < 0:
+            self._pop(key)
+            raise KeyError(key)
+        self.cache.move_to_end(key)
+        if self.policy is not None:
+            self.policy.access(key)
+        return value, ttl
+
     async def set(self, key: str, value: Any, ttl: float) -> None:
         if ttl <= 0:
             return
-        self.cache[key] = [value, time.time() + ttl]
-        if time.time() - self.last_expired > 60:
-            self.last_expired = time.time()
-            for old_key, (_, expire) in self.cache.items():
-                if time.time() > expire:
-                    self.cache.pop(old_key, None)
+        size = 0 if self.max_bytes is None else self.sizer(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self._pop(key)
+            return
+        now = time.time()
+        expire = now + ttl
+        self._pop(key)
+        self.cache[key] = (value, expire, size)
+        self._bytes_used += size
+        if self.policy is not None:
+            self.policy.insert(key)
+        if not math.isinf(expire):
+            heapq.heappush(self._deadlines, (expire, key))
+        if self.max_entries is not None:
+            while len(self.cache) > self.max_entries:
+                self._pop(self._victim())
+        if self.max_bytes is not None:
+            while self._bytes_used > self.max_bytes:
+                self._pop(self._victim())
+        self._expire(now)
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        values = {}
+        now = time.time()
+        for key in keys:
+            entry = self.cache.get(key)
+            if entry is None:
+                continue
+            if now > entry[1]:
+                self._pop(key)
+                continue
+            self.cache.move_to_end(key)
+            if self.policy is not None:
+                self.policy.access(key)
+            values[key] = entry[0]
+        return values
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float]]:
+        entries = {}
+        now = time.time()
+        for key in keys:
+            entry = self.cache.get(key)
+            if entry is None:
+                continue
+            if now > entry[1]:
+                self._pop(key)
+                continue
+            self.cache.move_to_end(key)
+            if self.policy is not None:
+                self.policy.access(key)
+            entries[key] = (entry[0], entry[1] - now)
+        return entries
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._pop(key)
+
+    async def delete_many(self, keys: list[str]) -> None:
+        for key in keys:
+            self._pop(key)
 
     async def clear(self) -> None:
         self.cache.clear()
+        self._deadlines.clear()
+        self._bytes_used = 0
+        if self.policy is not None:
+            self.policy.clear()
+
+    def _victim(self) -> str:
+        if self.policy is None:
+            return next(iter(self.cache))
+        return self.policy.victim()
+
+    def _pop(self, key: str) -> None:
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self._bytes_used -= entry[2]
+            if self.policy is not None:
+                self.policy.remove(key)
+
+    def _expire(self, now: float) -> None:
+        deadlines = self._deadlines
+        for _ in range(self.expire_batch_size):
+            if not deadlines or deadlines[0][0] > now:
+                break
+            expire, key = heapq.heappop(deadlines)
+            entry = self.cache.get(key)
+            if entry is not None and entry[1] == expire:
+                self._pop(key)
+        if len(deadlines) > 2 * len(self.cache) + 64:
+            # Compact deadlines left behind by overwritten or evicted entries
+            self._deadlines = [
+                (expire, key) for key, (_, expire, _) in self.cache.items() if not math.isinf(expire)
+            ]
+            heapq.heapify(self._deadlines)
 
 
 class DiskCache(BaseCache):
@@ -82,26 +842,71 @@ class DiskCache(BaseCache):
     ```python
     DiskCache() # Cache on tmp
     DiskCache("folder") # Cache on folder/
+    DiskCache("folder", max_bytes=100 * 1024**3) # Cull beyond ~100 GiB
+    DiskCache("folder", codec=ZstdCodec()) # Compress values of 1 KiB or larger
     ```
 
     Parameters:
         directory: Cache directory, uses tmp if None.
         shards: Number of shards to distribute writes.
         serializer: Serializer package supporting `loads` and `dumps`.
+        max_bytes: Maximum approximate bytes on disk, uses `diskcache` default if None.
+        codec: Codec supporting `compress` and `decompress` of serialized values, e.g. `ZlibCodec` or `ZstdCodec`.
+        compress_threshold: Minimum size in bytes of serialized values to be compressed.
     """
 
-    def __init__(self, directory: str | None = None, shards: int = 8, serializer=pickle) -> None:
+    def __init__(
+        self,
+        directory: str | None = None,
+        shards: int = 8,
+        serializer=pickle,
+        max_bytes: int | None = None,
+        codec: ZlibCodec | ZstdCodec | None = None,
+        compress_threshold: int = 1024,
+    ) -> None:
         import diskcache
         self.directory = directory
         self.serializer = serializer
-        self.cache = diskcache.FanoutCache(directory, shards)
+        self.codec = codec
+        self.compress_threshold = compress_threshold
+        settings = {} if max_bytes is None else {"size_limit": max_bytes}
+        self.cache = diskcache.FanoutCache(directory, shards, **settings)
+        self._volume: int | None = None
+        self._volume_checked = 0.0
+
+    @property
+    def bytes_used(self) -> int | None:
+        """Approximate number of bytes used on disk.
+
+        Within an event loop the volume is read in the executor at most once per second and the
+        last value read is returned (None until read), outside of it the volume is read directly.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.cache.volume()
+        if time.time() - self._volume_checked > 1:
+            self._volume_checked = time.time()
+            loop.run_in_executor(None, self._read_volume)
+        return self._volume
+
+    def _read_volume(self) -> None:
+        self._volume = self.cache.volume()
 
     @sync_to_async()
     def get[T](self, key: str) -> T:
         value = self.cache.get(key)
         if value is None:
             raise KeyError(key)
-        return self.serializer.loads(value)
+        return self.serializer.loads(_decompress(self.codec, value))
+
+    @sync_to_async()
+    def get_with_ttl[T](self, key: str) -> tuple[T, float]:
+        value, expire_time = self.cache.get(key, expire_time=True)
+        if value is None:
+            raise KeyError(key)
+        ttl = math.inf if expire_time is None else expire_time - time.time()
+        return self.serializer.loads(_decompress(self.codec, value)), ttl
 
     @sync_to_async()
     def set(self, key: str, value: Any, ttl: float) -> None:
@@ -109,8 +914,921 @@ class DiskCache(BaseCache):
             return
         if math.isinf(ttl):
             ttl = None
-        self.cache.set(key, self.serializer.dumps(value), ttl)
+        self.cache.set(key, _compress(self.codec, self.compress_threshold, self.serializer.dumps(value)), ttl)
+
+    @sync_to_async()
+    def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        values = {}
+        for key in keys:
+            value = self.cache.get(key)
+            if value is not None:
+                values[key] = self.serializer.loads(_decompress(self.codec, value))
+        return values
+
+    @sync_to_async()
+    def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float]]:
+        entries = {}
+        for key in keys:
+            value, expire_time = self.cache.get(key, expire_time=True)
+            if value is not None:
+                ttl = math.inf if expire_time is None else expire_time - time.time()
+                entries[key] = (self.serializer.loads(_decompress(self.codec, value)), ttl)
+        return entries
+
+    @sync_to_async()
+    def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            return
+        if math.isinf(ttl):
+            ttl = None
+        for key, value in values.items():
+            self.cache.set(key, _compress(self.codec, self.compress_threshold, self.serializer.dumps(value)), ttl)
+
+    @sync_to_async()
+    def delete(self, key: str) -> None:
+        self.cache.delete(key)
+
+    @sync_to_async()
+    def delete_many(self, keys: list[str]) -> None:
+        for key in keys:
+            self.cache.delete(key)
 
     @sync_to_async()
     def clear(self) -> None:
         self.cache.clear()
+
+
+class SQLiteCache(BaseCache):
+    """SQLite Cache.
+
+    This cache lives on disk in a single SQLite database (WAL mode), without third-party dependencies.
+
+    Values are serialized by `set` and queued in memory, then group committed by a dedicated writer
+    thread. `set` returns without waiting for disk unless `max_queued` writes are pending, and queued
+    values are readable immediately. Expired values are ignored by reads and deleted in the background
+    every `vacuum_interval` seconds.
+
+    Example:
+    ```python
+    SQLiteCache() # Cache on tmp
+    SQLiteCache("cache.sqlite3") # Cache on cache.sqlite3
+    SQLiteCache("cache.sqlite3", codec=ZstdCodec()) # Compress values of 1 KiB or larger
+    ```
+
+    Parameters:
+        path: Database file path, uses tmp if None.
+        serializer: Serializer package supporting `loads` and `dumps`.
+        codec: Codec supporting `compress` and `decompress` of serialized values, e.g. `ZlibCodec` or `ZstdCodec`.
+        compress_threshold: Minimum size in bytes of serialized values to be compressed.
+        batch_size: Maximum number of writes per commit.
+        vacuum_interval: Interval in seconds between deletions of expired values.
+        max_queued: Maximum number of queued writes before `set` waits for the writer thread.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        serializer=pickle,
+        codec: ZlibCodec | ZstdCodec | None = None,
+        compress_threshold: int = 1024,
+        batch_size: int = 1000,
+        vacuum_interval: float = 60,
+        max_queued: int = 10000,
+    ) -> None:
+        self.path = path or os.path.join(tempfile.mkdtemp(), "pulsefire.sqlite3")
+        self.serializer = serializer
+        self.codec = codec
+        self.compress_threshold = compress_threshold
+        self.batch_size = batch_size
+        self.vacuum_interval = vacuum_interval
+        self.max_queued = max_queued
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._pending: dict[str, tuple[bytes, float | None]] = {}
+        self._pending_lock = threading.Lock()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        connection = self._connect()
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            connection.execute("VACUUM") # Files created without incremental auto vacuum
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expire REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_expire ON cache (expire)")
+        connection.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="pulsefire-sqlitecache", daemon=True)
+        self._writer.start()
+
+    @property
+    def bytes_used(self) -> int:
+        return sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal")
+            if os.path.exists(self.path + suffix)
+        )
+
+    async def get[T](self, key: str) -> T:
+        value, _ = await self.get_with_ttl(key)
+        return value
+
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float]:
+        if (entry := self._pending.get(key)) is not None:
+            data, expire = entry
+            ttl = math.inf if expire is None else expire - time.time()
+            if ttl < 0:
+                raise KeyError(key)
+            return self.serializer.loads(_decompress(self.codec, data)), ttl
+        return await self._select(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        if self._queue.qsize() >= self.max_queued:
+            await self.flush()
+        data = _compress(self.codec, self.compress_threshold, self.serializer.dumps(value))
+        entry = (data, None if math.isinf(ttl) else time.time() + ttl)
+        with self._pending_lock:
+            self._pending[key] = entry
+        self._queue.put((key, entry))
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        return {key: value for key, (value, _) in (await self.get_many_with_ttl(keys)).items()}
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float]]:
+        entries = {}
+        missing = []
+        now = time.time()
+        for key in keys:
+            if (entry := self._pending.get(key)) is None:
+                missing.append(key)
+            elif entry[1] is None or entry[1] > now:
+                ttl = math.inf if entry[1] is None else entry[1] - now
+                entries[key] = (self.serializer.loads(_decompress(self.codec, entry[0])), ttl)
+        if missing:
+            entries.update(await self._select_many(missing))
+        return entries
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.delete_many([key])
+
+    async def delete_many(self, keys: list[str]) -> None:
+        with self._pending_lock:
+            for key in keys:
+                self._pending.pop(key, None)
+        await self._command("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+
+    async def clear(self) -> None:
+        with self._pending_lock:
+            self._pending.clear()
+        await self._command("DELETE FROM cache")
+
+    async def flush(self) -> None:
+        """Wait until queued writes are committed."""
+        await self._command(None)
+
+    async def close(self) -> None:
+        """Commit queued writes, stop the writer thread and close reader connections."""
+        await self._command(None)
+        self._queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+            self._local = threading.local()
+        for connection in readers:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL") # Before WAL mode, which initializes new files
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """Return the reader connection of the current thread."""
+        local = self._local
+        if not hasattr(local, "connection"):
+            local.connection = self._connect()
+            with self._readers_lock:
+                self._readers.append(local.connection)
+        return local.connection
+
+    @sync_to_async()
+    def _select(self, key: str) -> tuple[Any, float]:
+        row = self._reader().execute(
+            "SELECT value, expire FROM cache WHERE key = ? AND (expire IS NULL OR expire > ?)",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value, expire = row
+        ttl = math.inf if expire is None else expire - time.time()
+        return self.serializer.loads(_decompress(self.codec, value)), ttl
+
+    @sync_to_async()
+    def _select_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        connection = self._reader()
+        entries = {}
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            for key, value, expire in connection.execute(
+                f"SELECT key, value, expire FROM cache WHERE key IN ({', '.join('?' * len(chunk))}) "
+                "AND (expire IS NULL OR expire > ?)",
+                (*chunk, now),
+            ):
+                ttl = math.inf if expire is None else expire - now
+                entries[key] = (self.serializer.loads(_decompress(self.codec, value)), ttl)
+        return entries
+
+    async def _command(self, sql: str | None, rows: list[tuple] | None = None) -> None:
+        future = concurrent.futures.Future()
+        self._queue.put((future, sql, rows))
+        await asyncio.wrap_future(future)
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        last_vacuumed = time.time()
+        item = ()
+        while item is not None:
+            try:
+                item = self._queue.get(timeout=self.vacuum_interval)
+            except queue.Empty:
+                item = ()
+            batch = {}
+            while item:
+                if isinstance(item[0], concurrent.futures.Future):
+                    future, sql, rows = item
+                    try:
+                        self._commit(connection, batch)
+                        if sql and rows is not None:
+                            connection.executemany(sql, rows)
+                            connection.commit()
+                        elif sql:
+                            connection.execute(sql)
+                            connection.commit()
+                    except Exception as exc:
+                        future.set_exception(exc)
+                    else:
+                        future.set_result(None)
+                    batch = {}
+                else:
+                    key, entry = item
+                    batch[key] = entry
+                    if len(batch) >= self.batch_size:
+                        break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self._commit(connection, batch)
+                if time.time() - last_vacuumed > self.vacuum_interval:
+                    last_vacuumed = time.time()
+                    connection.execute("DELETE FROM cache WHERE expire <= ?", (last_vacuumed,))
+                    connection.commit()
+                    connection.execute("PRAGMA incremental_vacuum").fetchall() # Frees a page per step
+            except Exception:
+                LOGGER.exception("SQLiteCache: failed to write to database")
+        connection.close()
+
+    def _commit(self, connection: sqlite3.Connection, batch: dict[str, tuple[bytes, float | None]]) -> None:
+        if not batch:
+            return
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expire) VALUES (?, ?, ?)",
+                [(key, data, expire) for key, (data, expire) in batch.items()],
+            )
+            connection.commit()
+        finally:
+            with self._pending_lock:
+                for key, entry in batch.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+
+_SHM_MAGIC = b"PFSHM\x00\x00\x02"
+_SHM_HEADER_SIZE = 64
+_SHM_U32 = struct.Struct("!I")
+_SHM_U64 = struct.Struct("!Q")
+_SHM_F64 = struct.Struct("!d")
+_SHM_CLASS = struct.Struct("!Iq")
+_SHM_SLOT = struct.Struct("!IQdd")
+_SHM_CHUNK = struct.Struct("!IIIB")
+_SHM_FREE_CHUNK = struct.Struct("!Iq")
+_SHM_NO_SLOT = 0xFFFFFFFF
+_SHM_NO_CLASS = 0xFF
+_SHM_LARGE = 0xFE
+_SHM_LARGE_TAIL = 0xFD
+
+
+def _slab_sizes(page_size: int) -> list[int]:
+    sizes = []
+    size = 64
+    while size < page_size:
+        sizes.append(size)
+        size = (int(size * 1.25) + 7) // 8 * 8
+    sizes.append(page_size)
+    return sizes
+
+
+class SharedMemoryCache(BaseCache):
+    """Shared Memory Cache.
+
+    This cache lives in a memory-mapped file shared by every process on the host opening the same
+    `path`, e.g. one process per core sharing static CDN data instead of duplicating it.
+
+    Entries are stored in a slab allocator with fixed size classes inside pages of the mapped file,
+    which never grows. When a size class runs out of chunks, the least recently used of a few sampled
+    entries is evicted. Values larger than a page (up to 1 MiB) span a run of contiguous pages, the
+    entries of a random run are evicted if no run is free. Values larger than `max_bytes` are not
+    cached and a warning is logged. Values are serialized once on write, reads copy the value out of the mapping
+    before decoding it, `bytes` values are stored raw. Processes are synchronized with `flock`, POSIX
+    only, contended locks are awaited in the default executor instead of blocking the event loop.
+
+    Example:
+    ```python
+    SharedMemoryCache("/dev/shm/myapp.cache") # Shared by processes opening /dev/shm/myapp.cache
+    SharedMemoryCache("/dev/shm/myapp.cache", max_bytes=1024**3) # Map 1 GiB of values
+    ```
+
+    Parameters:
+        path: Mapped file path, created if missing, every process opening it shares the cache.
+        max_bytes: Size in bytes of the values region, ignored if the file already exists.
+        max_entries: Maximum number of entries, ignored if the file already exists.
+        serializer: Serializer package supporting `loads` and `dumps`.
+    """
+
+    eviction_samples = 5
+    """Number of entries sampled when evicting."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_bytes: int = 256 * 1024**2,
+        max_entries: int = 65536,
+        serializer=pickle,
+    ) -> None:
+        import fcntl
+        self.path = path
+        self.serializer = serializer
+        self._fcntl = fcntl
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                self._create(max_bytes, max_entries)
+            else:
+                self._mm = mmap.mmap(self._fd, 0)
+                if self._mm[:len(_SHM_MAGIC)] != _SHM_MAGIC:
+                    raise ValueError(f"{path} is not a SharedMemoryCache file")
+                self._load_layout()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _create(self, max_bytes: int, max_entries: int) -> None:
+        page_size = 1024**2
+        while page_size > 4096 and max_bytes // page_size < 16:
+            page_size //= 2
+        page_count = max(1, max_bytes // page_size)
+        sizes = _slab_sizes(page_size)
+        # Inserts may hold one entry past a zero `max_entries`, always keep an empty slot to end probes.
+        slot_count = max(max_entries, 1) * 4 // 3 + 1
+        index_offset = _SHM_HEADER_SIZE + len(sizes) * _SHM_CLASS.size + page_count
+        data_offset = (index_offset + slot_count * _SHM_SLOT.size + 4095) // 4096 * 4096
+        os.ftruncate(self._fd, data_offset + page_count * page_size)
+        self._mm = mmap.mmap(self._fd, 0)
+        struct.pack_into("!IIIII", self._mm, len(_SHM_MAGIC), max_entries, slot_count, page_size, page_count, len(sizes))
+        for cls, size in enumerate(sizes):
+            _SHM_CLASS.pack_into(self._mm, _SHM_HEADER_SIZE + cls * _SHM_CLASS.size, size, -1)
+        self._load_layout()
+        self._mm[self._pages_offset:self._pages_offset + page_count] = bytes([_SHM_NO_CLASS]) * page_count
+        self._mm[:len(_SHM_MAGIC)] = _SHM_MAGIC
+
+    def _load_layout(self) -> None:
+        (
+            self._max_entries, self._slot_count, self._page_size, self._page_count, class_count,
+        ) = struct.unpack_from("!IIIII", self._mm, len(_SHM_MAGIC))
+        self._class_sizes = [
+            _SHM_CLASS.unpack_from(self._mm, _SHM_HEADER_SIZE + cls * _SHM_CLASS.size)[0]
+            for cls in range(class_count)
+        ]
+        self._pages_offset = _SHM_HEADER_SIZE + class_count * _SHM_CLASS.size
+        self._index_offset = self._pages_offset + self._page_count
+        self._data_offset = (self._index_offset + self._slot_count * _SHM_SLOT.size + 4095) // 4096 * 4096
+
+    @contextlib.asynccontextmanager
+    async def _locked(self, exclusive: bool):
+        operation = self._fcntl.LOCK_EX if exclusive else self._fcntl.LOCK_SH
+        if not self._acquire(operation, blocking=False):
+            future = asyncio.get_running_loop().run_in_executor(None, self._acquire, operation)
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The executor still takes the lock, hand it back once it does.
+                future.add_done_callback(lambda f: f.cancelled() or f.exception() or self._release())
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, operation: int, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            self._fcntl.flock(self._fd, operation if blocking else operation | self._fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._thread_lock.release()
+            return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return True
+
+    def _release(self) -> None:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    @property
+    def bytes_used(self) -> int:
+        return _SHM_U64.unpack_from(self._mm, 40)[0]
+
+    def __len__(self) -> int:
+        return _SHM_U32.unpack_from(self._mm, 36)[0]
+
+    async def get[T](self, key: str) -> T:
+        value, _ = await self.get_with_ttl(key)
+        return value
+
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float]:
+        async with self._locked(False):
+            return self._get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        async with self._locked(True):
+            self._set(key, value, ttl)
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        return {key: value for key, (value, _) in (await self.get_many_with_ttl(keys)).items()}
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float]]:
+        entries = {}
+        async with self._locked(False):
+            for key in keys:
+                try:
+                    entries[key] = self._get(key)
+                except KeyError:
+                    pass
+        return entries
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            return
+        async with self._locked(True):
+            for key, value in values.items():
+                self._set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.delete_many([key])
+
+    async def delete_many(self, keys: list[str]) -> None:
+        async with self._locked(True):
+            for key in keys:
+                _, offset = self._find(key.encode("utf-8"))
+                if offset:
+                    self._free_chunk(offset)
+
+    async def clear(self) -> None:
+        async with self._locked(True):
+            self._mm[self._index_offset:self._index_offset + self._slot_count * _SHM_SLOT.size] = bytes(self._slot_count * _SHM_SLOT.size)
+            self._mm[self._pages_offset:self._pages_offset + self._page_count] = bytes([_SHM_NO_CLASS]) * self._page_count
+            for cls in range(len(self._class_sizes)):
+                self._set_free_head(cls, -1)
+            struct.pack_into("!IIQ", self._mm, 32, 0, 0, 0)
+
+    def close(self) -> None:
+        """Unmap and close the file, the file is kept for other processes."""
+        self._mm.close()
+        os.close(self._fd)
+
+    def _get(self, key: str) -> tuple[Any, float]:
+        slot, offset = self._find(key.encode("utf-8"))
+        if not offset:
+            raise KeyError(key)
+        slot_offset = self._index_offset + slot * _SHM_SLOT.size
+        expire = _SHM_F64.unpack_from(self._mm, slot_offset + 12)[0]
+        now = time.time()
+        if expire <= now:
+            raise KeyError(key)
+        # Access times are eviction hints, racing writers under the shared lock are harmless.
+        _SHM_F64.pack_into(self._mm, slot_offset + 20, now)
+        _, key_size, value_size, raw = _SHM_CHUNK.unpack_from(self._mm, offset)
+        start = offset + _SHM_CHUNK.size + key_size
+        data = self._mm[start:start + value_size]
+        return (data if raw else self.serializer.loads(data)), expire - now
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        encoded_key = key.encode("utf-8")
+        raw = isinstance(value, bytes)
+        data = value if raw else self.serializer.dumps(value)
+        size = _SHM_CHUNK.size + len(encoded_key) + len(data)
+        pages = -(-size // self._page_size)
+        if pages > self._page_count:
+            LOGGER.warning(f"SharedMemoryCache: value of {key} ({size} bytes) exceeds the cache size, not cached")
+            return
+        _, offset = self._find(encoded_key)
+        if offset:
+            self._free_chunk(offset)
+        if len(self) >= self._max_entries and (offsets := self._sample_index()):
+            self._evict(offsets)
+        if pages > 1:
+            offset, chunk_size = self._alloc_pages(pages), pages * self._page_size
+        else:
+            cls = bisect.bisect_left(self._class_sizes, size)
+            offset, chunk_size = self._alloc(cls), self._class_sizes[cls]
+        slot, _ = self._find(encoded_key)
+        now = time.time()
+        _SHM_CHUNK.pack_into(self._mm, offset, slot, len(encoded_key), len(data), raw)
+        start = offset + _SHM_CHUNK.size
+        self._mm[start:start + len(encoded_key)] = encoded_key
+        self._mm[start + len(encoded_key):start + size - _SHM_CHUNK.size] = data
+        _SHM_SLOT.pack_into(self._mm, self._index_offset + slot * _SHM_SLOT.size, zlib.crc32(encoded_key), offset, now + ttl, now)
+        self._add_usage(1, chunk_size)
+
+    def _find(self, encoded_key: bytes) -> tuple[int, int]:
+        """Find the index slot of a key, returns the first empty slot and offset 0 if missing."""
+        key_hash = zlib.crc32(encoded_key)
+        slot = key_hash % self._slot_count
+        while True:
+            slot_hash, offset, _, _ = _SHM_SLOT.unpack_from(self._mm, self._index_offset + slot * _SHM_SLOT.size)
+            if not offset:
+                return slot, 0
+            if slot_hash == key_hash:
+                key_size = _SHM_CHUNK.unpack_from(self._mm, offset)[1]
+                start = offset + _SHM_CHUNK.size
+                if self._mm[start:start + key_size] == encoded_key:
+                    return slot, offset
+            slot = (slot + 1) % self._slot_count
+
+    def _delete_slot(self, slot: int) -> None:
+        # Backward shift deletion, keeps linear probing chains intact without tombstones.
+        hole = slot
+        while True:
+            slot = (slot + 1) % self._slot_count
+            slot_offset = self._index_offset + slot * _SHM_SLOT.size
+            slot_hash, offset, _, _ = _SHM_SLOT.unpack_from(self._mm, slot_offset)
+            if not offset:
+                break
+            home = slot_hash % self._slot_count
+            if (hole < slot and hole < home <= slot) or (hole > slot and (home > hole or home <= slot)):
+                continue
+            hole_offset = self._index_offset + hole * _SHM_SLOT.size
+            self._mm[hole_offset:hole_offset + _SHM_SLOT.size] = self._mm[slot_offset:slot_offset + _SHM_SLOT.size]
+            _SHM_U32.pack_into(self._mm, offset, hole)
+            hole = slot
+        hole_offset = self._index_offset + hole * _SHM_SLOT.size
+        self._mm[hole_offset:hole_offset + _SHM_SLOT.size] = bytes(_SHM_SLOT.size)
+
+    def _alloc(self, cls: int) -> int:
+        if self._free_head(cls) == -1:
+            page = self._free_pages(1)
+            if page != -1:
+                self._assign_page(page, cls)
+            else:
+                page_classes = self._mm[self._pages_offset:self._pages_offset + self._page_count]
+                pages = [page for page, page_cls in enumerate(page_classes) if page_cls == cls]
+                if pages:
+                    self._evict(self._sample_chunks(cls, pages))
+                else:
+                    page = random.randrange(self._page_count)
+                    self._reclaim_page(page)
+                    self._assign_page(page, cls)
+        offset = self._free_head(cls)
+        self._set_free_head(cls, _SHM_FREE_CHUNK.unpack_from(self._mm, offset)[1])
+        return offset
+
+    def _alloc_pages(self, pages: int) -> int:
+        """Allocate a run of contiguous pages for a large value, reclaiming a random run if none is free."""
+        page = self._free_pages(pages)
+        if page == -1:
+            page = random.randrange(self._page_count - pages + 1)
+            for reclaimed in range(page, page + pages):
+                self._reclaim_page(reclaimed)
+        self._mm[self._pages_offset + page] = _SHM_LARGE
+        self._mm[self._pages_offset + page + 1:self._pages_offset + page + pages] = bytes([_SHM_LARGE_TAIL]) * (pages - 1)
+        return self._data_offset + page * self._page_size
+
+    def _free_pages(self, pages: int) -> int:
+        """Return the first page of a run of unassigned pages, -1 if there is none."""
+        start = self._mm.find(bytes([_SHM_NO_CLASS]) * pages, self._pages_offset, self._pages_offset + self._page_count)
+        return start if start == -1 else start - self._pages_offset
+
+    def _assign_page(self, page: int, cls: int) -> None:
+        size = self._class_sizes[cls]
+        base = self._data_offset + page * self._page_size
+        head = self._free_head(cls)
+        for offset in reversed(range(base, base + self._page_size - size + 1, size)):
+            _SHM_FREE_CHUNK.pack_into(self._mm, offset, _SHM_NO_SLOT, head)
+            head = offset
+        self._set_free_head(cls, head)
+        self._mm[self._pages_offset + page] = cls
+
+    def _reclaim_page(self, page: int) -> None:
+        """Evict all entries of a page and drop its chunks from the free list of its class, leaving it unassigned."""
+        cls = self._mm[self._pages_offset + page]
+        if cls == _SHM_NO_CLASS:
+            return
+        if cls == _SHM_LARGE or cls == _SHM_LARGE_TAIL:
+            while self._mm[self._pages_offset + page] == _SHM_LARGE_TAIL:
+                page -= 1
+            self._free_chunk(self._data_offset + page * self._page_size)
+            return
+        size = self._class_sizes[cls]
+        base = self._data_offset + page * self._page_size
+        for offset in range(base, base + self._page_size - size + 1, size):
+            if _SHM_U32.unpack_from(self._mm, offset)[0] != _SHM_NO_SLOT:
+                self._free_chunk(offset, recycle=False)
+        head, prev, offset = -1, -1, self._free_head(cls)
+        while offset != -1:
+            next_offset = _SHM_FREE_CHUNK.unpack_from(self._mm, offset)[1]
+            if not base <= offset < base + self._page_size:
+                if prev == -1:
+                    head = offset
+                else:
+                    _SHM_FREE_CHUNK.pack_into(self._mm, prev, _SHM_NO_SLOT, offset)
+                prev = offset
+            offset = next_offset
+        if prev != -1:
+            _SHM_FREE_CHUNK.pack_into(self._mm, prev, _SHM_NO_SLOT, -1)
+        self._set_free_head(cls, head)
+        self._mm[self._pages_offset + page] = _SHM_NO_CLASS
+
+    def _free_chunk(self, offset: int, recycle: bool = True) -> None:
+        self._delete_slot(_SHM_U32.unpack_from(self._mm, offset)[0])
+        page = (offset - self._data_offset) // self._page_size
+        cls = self._mm[self._pages_offset + page]
+        if cls == _SHM_LARGE:
+            _, key_size, value_size, _ = _SHM_CHUNK.unpack_from(self._mm, offset)
+            pages = -(-(_SHM_CHUNK.size + key_size + value_size) // self._page_size)
+            self._mm[self._pages_offset + page:self._pages_offset + page + pages] = bytes([_SHM_NO_CLASS]) * pages
+            self._add_usage(-1, -pages * self._page_size)
+            return
+        self._add_usage(-1, -self._class_sizes[cls])
+        _SHM_FREE_CHUNK.pack_into(self._mm, offset, _SHM_NO_SLOT, self._free_head(cls) if recycle else -1)
+        if recycle:
+            self._set_free_head(cls, offset)
+
+    def _evict(self, offsets: list[int]) -> None:
+        """Evict the expired or least recently used entry among the sampled chunk offsets."""
+        now = time.time()
+        victim, victim_atime = 0, math.inf
+        for offset in offsets:
+            slot = _SHM_U32.unpack_from(self._mm, offset)[0]
+            if slot == _SHM_NO_SLOT:
+                continue
+            _, _, expire, atime = _SHM_SLOT.unpack_from(self._mm, self._index_offset + slot * _SHM_SLOT.size)
+            if expire <= now:
+                atime = -math.inf
+            if atime < victim_atime or not victim:
+                victim, victim_atime = offset, atime
+        if victim:
+            self._free_chunk(victim)
+
+    def _sample_chunks(self, cls: int, pages: list[int]) -> list[int]:
+        size = self._class_sizes[cls]
+        chunks_per_page = self._page_size // size
+        return [
+            self._data_offset + random.choice(pages) * self._page_size + random.randrange(chunks_per_page) * size
+            for _ in range(self.eviction_samples)
+        ]
+
+    def _sample_index(self) -> list[int]:
+        """Sample chunk offsets of occupied index slots, empty if the index has no entries."""
+        offsets = []
+        for _ in range(self.eviction_samples):
+            slot = random.randrange(self._slot_count)
+            for _ in range(self._slot_count):
+                if offset := _SHM_SLOT.unpack_from(self._mm, self._index_offset + slot * _SHM_SLOT.size)[1]:
+                    offsets.append(offset)
+                    break
+                slot = (slot + 1) % self._slot_count
+            else:
+                break
+        return offsets
+
+    def _free_head(self, cls: int) -> int:
+        return _SHM_CLASS.unpack_from(self._mm, _SHM_HEADER_SIZE + cls * _SHM_CLASS.size)[1]
+
+    def _set_free_head(self, cls: int, offset: int) -> None:
+        struct.pack_into("!q", self._mm, _SHM_HEADER_SIZE + cls * _SHM_CLASS.size + 4, offset)
+
+    def _add_usage(self, entries: int, size: int) -> None:
+        count, used = struct.unpack_from("!IQ", self._mm, 36)
+        struct.pack_into("!IQ", self._mm, 36, count + entries, used + size)
+
+
+class TieredCache(BaseCache):
+    """Tiered Cache.
+
+    Combines a fast bounded cache (L1) in front of a large cache (L2), typically a `MemoryCache`
+    in front of a `DiskCache`. Values are looked up in L1 then L2, L2 hits are promoted to L1 with
+    their remaining TTL. Values are written through to both tiers. If L2 does not expose TTLs,
+    its hits are promoted for `l1_ttl` if finite and not promoted otherwise.
+
+    Example:
+    ```python
+    TieredCache(MemoryCache(max_bytes=256 * 1024**2), DiskCache("folder"))
+    TieredCache(MemoryCache(max_entries=1000), DiskCache("folder"), l1_ttl=600) # Keep in L1 for 10 minutes at most
+    ```
+
+    Parameters:
+        l1: Fast bounded cache.
+        l2: Large cache.
+        l1_ttl: Maximum TTL of values in L1.
+    """
+
+    l1: BaseCache
+    """Fast bounded cache."""
+    l2: BaseCache
+    """Large cache."""
+    l1_ttl: float
+    """Maximum TTL of values in L1."""
+    l1_hits: int
+    """Number of hits in L1."""
+    l2_hits: int
+    """Number of hits in L2 (promoted to L1)."""
+    misses: int
+    """Number of misses in both tiers."""
+
+    def __init__(self, l1: BaseCache, l2: BaseCache, l1_ttl: float = math.inf) -> None:
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    @property
+    def bytes_used(self) -> int | None:
+        sizes = [size for size in (self.l1.bytes_used, self.l2.bytes_used) if size is not None]
+        return sum(sizes) if sizes else None
+
+    async def get[T](self, key: str) -> T:
+        value, _ = await self.get_with_ttl(key)
+        return value
+
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float | None]:
+        try:
+            value, ttl = await self.l1.get_with_ttl(key)
+        except KeyError:
+            pass
+        else:
+            self.l1_hits += 1
+            return value, ttl
+        try:
+            value, ttl = await self.l2.get_with_ttl(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.l2_hits += 1
+        await self._promote(key, value, ttl)
+        return value, ttl
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.l1.set(key, value, min(ttl, self.l1_ttl))
+        await self.l2.set(key, value, ttl)
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        return {key: value for key, (value, _) in (await self.get_many_with_ttl(keys)).items()}
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float | None]]:
+        entries = await self.l1.get_many_with_ttl(keys)
+        self.l1_hits += len(entries)
+        missing = [key for key in keys if key not in entries]
+        if not missing:
+            return entries
+        l2_entries = await self.l2.get_many_with_ttl(missing)
+        self.l2_hits += len(l2_entries)
+        self.misses += len(missing) - len(l2_entries)
+        for key, (value, ttl) in l2_entries.items():
+            await self._promote(key, value, ttl)
+        entries.update(l2_entries)
+        return entries
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        await self.l1.set_many(values, min(ttl, self.l1_ttl))
+        await self.l2.set_many(values, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.l1.delete(key)
+        await self.l2.delete(key)
+
+    async def delete_many(self, keys: list[str]) -> None:
+        await self.l1.delete_many(keys)
+        await self.l2.delete_many(keys)
+
+    async def clear(self) -> None:
+        await self.l1.clear()
+        await self.l2.clear()
+
+    async def _promote(self, key: str, value: Any, ttl: float | None) -> None:
+        if ttl is None:
+            if math.isinf(self.l1_ttl):
+                return
+            ttl = self.l1_ttl
+        await self.l1.set(key, value, min(ttl, self.l1_ttl))
+
+
+class ProxyCache(BaseCache):
+    """Proxy Cache.
+
+    Connects to a cache served stand-alone by `BaseCache.serve`, sharing a single cache across
+    runtimes (e.g. serverless functions, cronjobs, processes). Requests reuse keep-alive connections
+    and batch methods are performed in a single request.
+
+    Example:
+    ```python
+    ProxyCache("http://127.0.0.1:12228") # Proxy to 127.0.0.1:12228
+    ProxyCache("http://127.0.0.1:12228", secret=<SECRET>) # Proxy authentication
+    TieredCache(MemoryCache(max_entries=1000), ProxyCache("http://127.0.0.1:12228")) # Local L1
+    ```
+
+    Parameters:
+        url: URL of the served cache.
+        secret: Secret of the served cache if required.
+        serializer: Serializer package supporting `loads` and `dumps`.
+    """
+
+    def __init__(self, url: str, *, secret: str | None = None, serializer=pickle) -> None:
+        self.url = url.rstrip("/")
+        self.secret = secret
+        self.serializer = serializer
+        self.session: aiohttp.ClientSession | None = None
+
+    async def get[T](self, key: str) -> T:
+        value, _ = await self.get_with_ttl(key)
+        return value
+
+    async def get_with_ttl[T](self, key: str) -> tuple[T, float]:
+        entries = await self._get_entries([key])
+        if key not in entries:
+            raise KeyError(key)
+        return entries[key]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.set_many({key: value}, ttl)
+
+    async def get_many[T](self, keys: list[str]) -> dict[str, T]:
+        return {key: value for key, (value, _) in (await self._get_entries(keys)).items()}
+
+    async def get_many_with_ttl[T](self, keys: list[str]) -> dict[str, tuple[T, float | None]]:
+        return await self._get_entries(keys)
+
+    async def set_many(self, values: dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            return
+        data = _pack_entries({key: (self.serializer.dumps(value), ttl) for key, value in values.items()})
+        await self._request("/set_many", data=data)
+
+    async def delete(self, key: str) -> None:
+        await self.delete_many([key])
+
+    async def delete_many(self, keys: list[str]) -> None:
+        try:
+            await self._request("/delete_many", json={"keys": keys})
+        except aiohttp.ClientResponseError as e:
+            if e.status == 501:
+                raise NotImplementedError(f"Served cache at {self.url} does not support deletion") from e
+            raise
+
+    async def clear(self) -> None:
+        await self._request("/clear")
+
+    async def close(self) -> None:
+        """Close the keep-alive connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _get_entries(self, keys: list[str]) -> dict[str, tuple[Any, float | None]]:
+        data = await self._request("/get_many", json={"keys": keys})
+        return {key: (self.serializer.loads(value), ttl) for key, (value, ttl) in _unpack_entries(data).items()}
+
+    async def _request(self, path: str, **kwargs) -> bytes:
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        async with self.session.post(
+            self.url + path,
+            headers=self.secret and {"Authorization": "Bearer " + self.secret},
+            **kwargs,
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
@@ -3,12 +3,11 @@
 This module contains clients to APIs and resources in the Riot Games ecosystem.
 """
 from typing import Any, Literal, TypedDict, Sequence
-from types import MethodType
+from types import CodeType, FunctionType, MethodType
 import abc
 import asyncio
 import functools
 import inspect
-import itertools
 import sys
 
 import aiohttp
@@ -33,6 +32,27 @@ from .middlewares import Middleware
 type _str = Sequence[str]
 
 
+class _InvokePlan:
+    """Invocation plan of a client method, built once per code object."""
+
+    __slots__ = ("name", "varnames", "function")
+
+    name: str
+    """Name of the client method, used for resolving the invoker."""
+    varnames: tuple[str, ...]
+    """Names of the variables grabbed from the client method scope (excludes `self`)."""
+    function: FunctionType | None
+    """Unbound client method, bound to the client on each invocation. None if unknown."""
+
+    def __init__(self, code: CodeType, function: FunctionType | None = None) -> None:
+        self.name = code.co_name
+        self.varnames = tuple(dict.fromkeys(
+            name for name in (*code.co_varnames, *code.co_cellvars, *code.co_freevars)
+            if name != "self"
+        ))
+        self.function = function
+
+
 class BaseClient(abc.ABC):
     """Base client class.
 
@@ -52,6 +72,15 @@ class BaseClient(abc.ABC):
     session: aiohttp.ClientSession | None = None
     """Context manager client session."""
 
+    _invoke_plans: dict[CodeType, _InvokePlan] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._invoke_plans = dict(cls._invoke_plans)
+        for name, member in vars(cls).items():
+            if not name.startswith("_") and inspect.iscoroutinefunction(member):
+                cls._invoke_plans[member.__code__] = _InvokePlan(member.__code__, member)
+
     def __init__(
         self,
         *,
@@ -66,6 +95,7 @@ class BaseClient(abc.ABC):
         self.default_params = default_params
         self.default_queries = default_queries
         self.middlewares = middlewares
+        self._default_params = {key: value for key, value in default_params.items() if value is not ...}
         async def run_invocation(invocation: Invocation):
             return await invocation()
         self.middleware_begin = run_invocation
@@ -135,14 +165,26 @@ class BaseClient(abc.ABC):
         Params are automatically grabbed from the outer frame (ignores `...`).
         The invoker client method is automatically grabbed from the outer frame
         and passed to the instantiation of Invocation.
+
+        Variable names and invokers are resolved once per client method through
+        precompiled invocation plans.
         """
+        frame = sys._getframe(1)
+        try:
+            plan = self._invoke_plans[frame.f_code]
+        except KeyError:
+            plan = self._invoke_plans[frame.f_code] = _InvokePlan(frame.f_code)
+        f_locals = frame.f_locals
         params = {}
-        for key, value in itertools.chain(self.default_params.items(), sys._getframe(1).f_locals.items()):
-            if key != "self" and value != ...:
+        for key in plan.varnames:
+            value = f_locals.get(key, ...)
+            if value is not ...:
                 params[key] = value
+        for key, value in self._default_params.items():
+            params.setdefault(key, value)
         params["queries"] = {**self.default_queries, **params.get("queries", {})}
         params["headers"] = {**self.default_headers, **params.get("headers", {})}
-        invoker: MethodType | None = getattr(self, sys._getframe(1).f_code.co_name, None)
+        invoker = getattr(self, plan.name, None) if plan.function is None else MethodType(plan.function, self)
         invocation = Invocation(method, self.base_url + path_or_url, params, self.session, invoker=invoker)
         return await self.middleware_begin(invocation)
 
@@ -4,9 +4,16 @@ This module contains the base classes for implementing pulsefire.
 """
 
 from base64 import b64encode
-from typing import Any, Literal
+from typing import Any, Iterator, Literal
 from types import MethodType
+import contextlib
+import contextvars
+import enum
+import functools
+import itertools
 import os
+import re
+import string
 import urllib.parse
 
 import aiohttp
@@ -15,21 +22,133 @@ import aiohttp
 type HttpMethod = Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
 
 
+_is_url_safe = re.compile(r"[A-Za-z0-9_.\-~]*").fullmatch
+
+
+def _quote_plus(value: Any) -> str:
+    if type(value) is int:
+        return str(value)
+    if type(value) is not str:
+        if isinstance(value, bytes):
+            return urllib.parse.quote_plus(value)
+        value = str(value)
+    return value if _is_url_safe(value) else urllib.parse.quote_plus(value)
+
+
+class URLTemplate:
+    """Compiled URL format (bracket based).
+
+    Templates are compiled once per URL format and shared by all invocations of the same format,
+    use `URLTemplate.compile` to obtain the shared instance.
+    """
+
+    __slots__ = ("urlformat", "fields", "_parts")
+
+    urlformat: str
+    """URL format (bracket based)."""
+    fields: tuple[str, ...]
+    """Path parameters, in order of appearance."""
+
+    def __init__(self, urlformat: str) -> None:
+        self.urlformat = urlformat
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(urlformat):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                parts = None  # Fallback to `str.format_map`
+            if parts is not None:
+                parts.append((literal, field))
+        self.fields = tuple(
+            field for _, field, _, _ in string.Formatter().parse(urlformat) if field is not None
+        )
+        self._parts = parts and tuple(parts)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} urlformat={self.urlformat}>"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def compile(urlformat: str) -> "URLTemplate":
+        """Return the shared compiled template of a URL format."""
+        return URLTemplate(urlformat)
+
+    def format(self, params: dict[str, Any]) -> str:
+        """Build URL from the path parameters and `queries` (if any) in params.
+
+        Raises:
+            KeyError: When a path parameter is missing.
+        """
+        if self._parts is None:
+            url = self.urlformat.format_map(params)
+        else:
+            chunks = []
+            for literal, field in self._parts:
+                chunks.append(literal)
+                if field is not None:
+                    chunks.append(str(params[field]))
+            url = "".join(chunks)
+        if queries := params.get("queries", {}):
+            url += "?" + "&".join([_quote_plus(key) + "=" + _quote_plus(value) for key, value in queries.items()])
+        return url
+
+
+_sequence = itertools.count()
+
+
+class Priority(enum.IntEnum):
+    """Priority classes of invocations, lower values go first when waiting for rate limits."""
+
+    INTERACTIVE = 0
+    """User-facing requests (e.g. account lookups of a web page)."""
+    BACKGROUND = 1
+    """Regular requests, default."""
+    BACKFILL = 2
+    """Bulk requests that can wait (e.g. crawling match history)."""
+
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("pulsefire_priority", default=Priority.BACKGROUND)
+
+
+@contextlib.contextmanager
+def prioritize(priority: int) -> Iterator[None]:
+    """Set the priority of invocations created within the context, including tasks created within it.
+
+    Example:
+    ```python
+    with prioritize(Priority.INTERACTIVE):
+        account = await client.get_account_v1_by_riot_id(region="americas", game_name=..., tag_line=...)
+
+    with prioritize(Priority.BACKFILL):
+        async with TaskGroup(asyncio.Semaphore(100)) as tg:
+            for match_id in match_ids:
+                await tg.create_task(client.get_lol_match_v5_match(region="americas", id=match_id))
+    ```
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
 class Invocation:
     """Container used for building and peforming HTTP request."""
 
-    uid: str
-    """Invocation UID (unique per instance)."""
+    __slots__ = ("seq", "priority", "method", "urlformat", "session", "invoker", "response", "_params", "_uid", "_url")
+
+    seq: int
+    """Invocation sequence number (unique per process, monotonic)."""
+    priority: int
+    """Invocation priority, lower values go first, defaults to the priority set by `prioritize`."""
     method: HttpMethod
     """HTTP method."""
     urlformat: str
     """URL format (bracket based)."""
-    params: dict[str, Any]
-    """Invocation parameters (includes queries and headers)."""
     session: aiohttp.ClientSession | None
     """Client session used for request. Cannot perform HTTP request if is None."""
     invoker: MethodType | None
     """Bound method if invoked by client method, None otherwise."""
+    response: aiohttp.ClientResponse | None
+    """Last HTTP response received, None if no HTTP request has been performed."""
 
     def __init__(
         self,
@@ -40,37 +159,66 @@ class Invocation:
         *,
         invoker: MethodType | None = None,
         uid: str | None = None,
+        priority: int | None = None,
     ) -> None:
-        self.uid = uid or b64encode(os.urandom(12)).decode("utf-8")
+        self.seq = next(_sequence)
+        self.priority = _priority.get() if priority is None else priority
+        self._uid = uid or None
         self.method = method
         self.urlformat = urlformat
         self.params = params
         self.session = session
         self.invoker = invoker
+        self.response = None
 
     def __repr__(self) -> str:
-        return f"<{self.__class__.__name__} uid={self.uid} method={self.method} url={self.url}>"
+        return f"<{self.__class__.__name__} seq={self.seq} method={self.method} url={self.url}>"
 
     async def __call__(self) -> aiohttp.ClientResponse:
         """Build and perform HTTP request."""
         if self.session is None:
             raise RuntimeError("session is None, cannot perform HTTP request")
-        return await self.session.request(
+        self.response = await self.session.request(
             self.method,
             self.url,
             headers=self.params.get("headers", {}),
             json=self.params.get("json", None),
             data=self.params.get("data", None),
         )
+        return self.response
+
+    @property
+    def uid(self) -> str:
+        """Invocation UID (globally unique), generated on first access.
+
+        Generating the UID involves a syscall, it is only accessed when required
+        for tracking invocations (e.g. proxy rate limiting). Use `seq` otherwise.
+        """
+        if self._uid is None:
+            self._uid = b64encode(os.urandom(12)).decode("utf-8")
+        return self._uid
+
+    @property
+    def params(self) -> dict[str, Any]:
+        """Invocation parameters (includes queries and headers).
+
+        Reassigning params resets the memoized URL, in-place changes are only
+        reflected if done before the first access of `url`.
+        """
+        return self._params
+
+    @params.setter
+    def params(self, params: dict[str, Any]) -> None:
+        self._params = params
+        self._url = None
 
     @property
     def url(self) -> str:
-        """Build URL (includes query parameters).
+        """Build URL (includes query parameters), built once and memoized per invocation.
 
         Raises:
             KeyError: When a path parameter is missing.
         """
-        url = self.urlformat.format(**self.params)
-        if queries := self.params.get("queries", {}):
-            url += '?' + urllib.parse.urlencode(queries)
-        return url
+        if self._url is None:
+            self._url = URLTemplate.compile(self.urlformat).format(self._params)
+        return self._url
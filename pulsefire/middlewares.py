@@ -4,16 +4,21 @@ This module contains middlewares used by pulsefire clients, middlewares provides
 flexible ways to manipulate and run operations on invocations and responses.
 """
 
-from typing import Any, Awaitable, Callable
+from typing import Any, Awaitable, Callable, Iterable, Mapping, NamedTuple
 import asyncio
 import collections
+import email.utils
+import hashlib
 import json
 import logging
+import math
 import time
 
 import aiohttp
+import multidict
+import yarl
 
-from .caches import BaseCache
+from .caches import BaseCache, CachedResponse, CacheRule, CacheTTL
 from .invocation import Invocation
 from .ratelimiters import BaseRateLimiter
 
@@ -25,6 +30,50 @@ type Middleware = Callable[[MiddlewareCallable], MiddlewareCallable]
 LOGGER = logging.getLogger("pulsefire.middlewares")
 
 
+def _retrieve_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+async def _single_flight[T](
+    inflight: dict[str, asyncio.Future],
+    key: str,
+    func: Callable[[], Awaitable[T]],
+    counter: collections.Counter[str] | None = None,
+) -> T:
+    """Await `func` once for concurrent calls of the same key, sharing its result or exception.
+
+    If the running call is cancelled, waiting calls retry. Waiting calls are recorded in `counter["coalesced"]`.
+    """
+    while (future := inflight.get(key)) is not None:
+        if counter is not None:
+            counter["coalesced"] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            if counter is not None:
+                counter["coalesced"] -= 1
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(_retrieve_exception)
+    inflight[key] = future
+    try:
+        value = await func()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        if inflight.get(key) is future:
+            del inflight[key]
+
+
 def http_error_middleware(max_retries: int = 3):
     """HTTP error middleware.
 
@@ -113,10 +162,151 @@ def json_response_middleware(loads: Callable[[str | bytes | bytearray], Any] = j
     return constructor
 
 
-def cache_middleware(cache: BaseCache, rules: list[tuple[Callable[[Invocation], bool], float]]):
+def _rule_matcher(rules: list[tuple] | dict[str, Any], default: float = 0) -> Callable[[Invocation], tuple]:
+    """Build a matcher returning the (ttl, *extras) of the first matching rule, (default,) if none matches.
+
+    Dict rules are indexed by invoker name, list rules are evaluated in order.
+    """
+    if isinstance(rules, dict):
+        indexed = {name: spec if isinstance(spec, tuple) else (spec,) for name, spec in rules.items()}
+
+        def match_indexed(invocation: Invocation) -> tuple:
+            if invocation.invoker is None:
+                return (default,)
+            return indexed.get(invocation.invoker.__name__, (default,))
+
+        return match_indexed
+
+    rules.append((lambda _: True, default)) # Add default
+
+    def match(invocation: Invocation) -> tuple:
+        for cond, *spec in rules:
+            if cond(invocation):
+                return spec
+        raise RuntimeError("rules out of range")
+
+    return match
+
+
+def default_cache_key(invocation: Invocation) -> str:
+    """Cache key of an invocation, its method and URL as is."""
+    return f"{invocation.method} {invocation.url}"
+
+
+def canonical_cache_key(headers: Iterable[str] = (), *, max_length: int = 128) -> Callable[[Invocation], str]:
+    """Canonical cache key of an invocation, for higher hit rates and compact keys.
+
+    Query parameters are sorted and the host is lowercased (e.g. `NA1` and `na1` regions), headers are
+    dropped unless allowlisted in `headers`. Keys longer than `max_length` are hashed into a fixed
+    size key (method followed by a 128-bit BLAKE2b digest), reducing memory of cache indexes.
+
+    Example:
+    ```python
+    cache_middleware(cache, [...], key=canonical_cache_key())
+    cache_middleware(cache, [...], key=canonical_cache_key(["Accept-Language"], max_length=64))
+    ```
+
+    Parameters:
+        headers: Names of headers affecting the response, included in keys.
+        max_length: Maximum length of keys before hashing.
+    """
+
+    allowlist = sorted({header.lower() for header in headers})
+
+    def key(invocation: Invocation) -> str:
+        url, _, query = invocation.url.partition("?")
+        scheme, separator, rest = url.partition("://")
+        host, slash, path = rest.partition("/")
+        chunks = [invocation.method, " ", scheme, separator, host.lower(), slash, path]
+        if query:
+            chunks.append("?")
+            chunks.append("&".join(sorted(query.split("&"))))
+        if allowlist:
+            invocation_headers = {name.lower(): value for name, value in invocation.params.get("headers", {}).items()}
+            for name in allowlist:
+                if name in invocation_headers:
+                    chunks.append(f"\n{name}: {invocation_headers[name]}")
+        canonical_key = "".join(chunks)
+        if len(canonical_key) <= max_length:
+            return canonical_key
+        return f"{invocation.method} #{hashlib.blake2b(canonical_key.encode('utf-8'), digest_size=16).hexdigest()}"
+
+    return key
+
+
+def _parse_cache_headers(headers: Mapping[str, str]) -> float | None:
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+    try:
+        if "max-age" in directives:
+            return max(0, int(directives["max-age"]) - int(headers.get("Age", 0)))
+        if expires := headers.get("Expires"):
+            date = headers.get("Date")
+            now = email.utils.parsedate_to_datetime(date).timestamp() if date else time.time()
+            return max(0, email.utils.parsedate_to_datetime(expires).timestamp() - now)
+    except (ValueError, TypeError):
+        return 0
+    return None
+
+
+def cache_control_ttl(max_ttl: float = math.inf, *, default: float = 0) -> Callable[[Invocation], float]:
+    """Cache TTL derived from `Cache-Control: max-age` or `Expires` headers of the response.
+
+    Used as ttl of `cache_middleware` rules, `no-store` and `no-cache` responses are not cached.
+    The response is read from `invocation.response`, deserialized values can be cached too.
+
+    Example:
+    ```python
+    cache_middleware(cache, [
+        (lambda inv: True, cache_control_ttl(86400, default=600)), # headers TTL up to 1 day, 10 minutes if none.
+    ])
+    ```
+
+    Parameters:
+        max_ttl: Maximum TTL in seconds.
+        default: TTL in seconds if the response has no caching headers.
+    """
+
+    def ttl(invocation: Invocation) -> float:
+        if invocation.response is None:
+            return default
+        header_ttl = _parse_cache_headers(invocation.response.headers)
+        return min(max_ttl, default if header_ttl is None else header_ttl)
+
+    return ttl
+
+
+def cache_middleware(
+    cache: BaseCache,
+    rules: list[CacheRule] | dict[str, CacheTTL | tuple[CacheTTL, float]],
+    *,
+    batch_lookups: bool = False,
+    key: Callable[[Invocation], str] = default_cache_key,
+):
     """Cache middleware.
 
-    Recommended to be placed before response deserialization middlewares.
+    Recommended to be placed before response deserialization middlewares, caching deserialized values.
+    If placed after response deserialization middlewares, raw response bodies are cached instead as
+    `CachedResponse`, deserialization then happens on every use, which is cheaper to store than
+    serialized python objects on non-memory caches.
+
+    Concurrent misses of the same key are locked, only one of them proceeds to the next middleware
+    and the rest receive its result. Rules may define a stale-while-revalidate window (in seconds) as
+    a third element, during which an expired value is returned immediately while a single background
+    refresh is performed. Values are stored as is for ttl plus the window, a value is stale once its
+    remaining TTL is within the window, values of caches not reporting TTLs are never stale. TTLs may
+    be derived from the response headers with `cache_control_ttl`.
+
+    Rules may be a dict of invoker name to ttl or (ttl, stale-while-revalidate), matched by a single
+    lookup instead of evaluating conditions in order, invocations of other invokers are not cached.
+
+    If `batch_lookups` is on, lookups of invocations started in the same event loop iteration
+    (e.g. tasks created in a `TaskGroup`) are batched into a single `cache.get_many_with_ttl`,
+    recommended for caches where each lookup is a round-trip (e.g. `DiskCache`, `SQLiteCache`).
 
     Example:
     ```python
@@ -124,32 +314,446 @@ def cache_middleware(cache: BaseCache, rules: list[tuple[Callable[[Invocation],
     cache_middleware(cache, [
         (lambda inv: inv.invoker.__name__ == "get_lol_v1_champion", 3600),
         (lambda inv: inv.invoker.__name__ ..., float("inf")), # cache indefinitely.
+        (lambda inv: inv.invoker.__name__ ..., 3600, 600), # serve stale for 10 minutes while refreshing.
         (lambda inv: inv.url ..., 3600),
         (lambda inv: inv.params ..., 3600),
+        (lambda inv: inv.url ..., cache_control_ttl(3600)), # TTL from headers up to 1 hour.
     ])
+
+    # Rules by invoker name
+    cache_middleware(cache, {
+        "get_lol_v1_champion": 3600,
+        "get_lol_v1_items": (3600, 600),
+        "get_lol_v1_perks": cache_control_ttl(86400),
+    })
+
+    # Cache raw response bodies
+    CDragonClient(middlewares=[
+        json_response_middleware(orjson.loads),
+        cache_middleware(DiskCache("folder"), [...]),
+        http_error_middleware(),
+    ])
+
+    # Batch lookups of concurrent invocations
+    cache_middleware(SQLiteCache("cache.sqlite3"), [...], batch_lookups=True)
+
+    # Canonical keys, sorted queries and hashed long URLs
+    cache_middleware(cache, [...], key=canonical_cache_key())
     ```
 
     Parameters:
         cache: Cache instance.
-        rules: Cache rules, defined by a list of (condition, ttl).
+        rules: Cache rules, defined by a list of (condition, ttl) or (condition, ttl, stale-while-revalidate),
+            or a dict of invoker name to ttl or (ttl, stale-while-revalidate).
+        batch_lookups: Batch lookups of invocations started in the same event loop iteration.
+        key: Function building the cache key of an invocation, e.g. `canonical_cache_key()`.
     """
 
-    rules.append((lambda _: True, 0)) # Add default
+    match = _rule_matcher(rules)
+    build_key = key
+    inflight: dict[str, asyncio.Future] = {}
+    lookups: dict[str, asyncio.Future] = {}
+    tasks: set[asyncio.Task] = set()
+
+    def spawn(coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def resolve_lookups(batch: dict[str, asyncio.Future]):
+        try:
+            entries = await cache.get_many_with_ttl(list(batch))
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key, future in batch.items():
+            if future.done():
+                continue
+            if key in entries:
+                future.set_result(entries[key])
+            else:
+                future.set_exception(KeyError(key))
+
+    def flush_lookups() -> None:
+        batch = lookups.copy()
+        lookups.clear()
+        spawn(resolve_lookups(batch))
+
+    async def lookup(key: str) -> tuple[Any, float | None]:
+        if not batch_lookups:
+            return await cache.get_with_ttl(key)
+        if (future := lookups.get(key)) is None:
+            loop = asyncio.get_running_loop()
+            if not lookups:
+                loop.call_soon(flush_lookups)
+            future = lookups[key] = loop.create_future()
+            future.add_done_callback(_retrieve_exception)
+        return await asyncio.shield(future)
 
     def constructor(next: MiddlewareCallable):
 
+        async def fetch(invocation: Invocation, key: str, ttl: CacheTTL, swr: float):
+            value = await next(invocation)
+            if isinstance(value, aiohttp.ClientResponse):
+                value = await CachedResponse.from_response(value)
+            if callable(ttl):
+                ttl = ttl(invocation)
+                if ttl <= 0:
+                    return value
+            await cache.set(key, value, ttl + swr)
+            return value
+
+        async def refresh(invocation: Invocation, key: str, ttl: CacheTTL, swr: float):
+            try:
+                await _single_flight(inflight, key, lambda: fetch(invocation, key, ttl, swr))
+            except Exception:
+                LOGGER.warning(f"cache_middleware: failed to revalidate {key}", exc_info=True)
+
         async def middleware(invocation: Invocation):
-            key = f"{invocation.method} {invocation.url}"
-            for cond, ttl in rules:
-                if not cond(invocation):
-                    continue
-                try:
-                    value = await cache.get(key)
-                except KeyError:
-                    value = await next(invocation)
-                    await cache.set(key, value, ttl)
-                return value
-            raise RuntimeError("rules out of range")
+            ttl, *extras = match(invocation)
+            swr = extras[0] if extras else 0
+            if not callable(ttl) and ttl <= 0:
+                return await next(invocation)
+            key = build_key(invocation)
+            try:
+                value, remaining = await lookup(key)
+            except KeyError:
+                return await _single_flight(inflight, key, lambda: fetch(invocation, key, ttl, swr))
+            if swr > 0 and remaining is not None and remaining < swr and key not in inflight:
+                spawn(refresh(invocation, key, ttl, swr))
+            return value
+
+        return middleware
+
+    return constructor
+
+
+def coalesce_middleware(counter: collections.Counter[str] | None = None):
+    """Request coalescing middleware.
+
+    Identical in-flight GET invocations (same method and URL) are coalesced into a single request,
+    the first invocation proceeds and the rest await its result, exceptions are propagated to all of them.
+    If the proceeding invocation is cancelled, one of the waiting invocations proceeds instead.
+    Number of requests saved is recorded in `counter["coalesced"]`.
+
+    Recommended to be placed after cache middlewares and before response deserialization middlewares,
+    the deserialized value is shared by all coalesced invocations, avoid mutating it in place.
+
+    Example:
+    ```python
+    counter = collections.Counter()
+    coalesce_middleware(counter)
+    ...
+    counter["coalesced"] # Number of requests saved
+    ```
+
+    Parameters:
+        counter: Counter for recording number of coalesced invocations.
+    """
+
+    inflight: dict[str, asyncio.Future] = {}
+
+    def constructor(next: MiddlewareCallable):
+
+        async def middleware(invocation: Invocation):
+            if invocation.method != "GET":
+                return await next(invocation)
+            return await _single_flight(inflight, invocation.url, lambda: next(invocation), counter)
+
+        return middleware
+
+    return constructor
+
+
+class _Validated(NamedTuple):
+    """Cached response with its revalidation deadline."""
+
+    response: CachedResponse
+    fresh_until: float
+
+
+_REVALIDATED_HEADERS = ("ETag", "Last-Modified", "Cache-Control", "Expires", "Date")
+"""Headers of a `304 Not Modified` response replacing those of the cached response."""
+
+
+def revalidation_middleware(
+    cache: BaseCache,
+    rules: list[tuple[Callable[[Invocation], bool], float]] | dict[str, float],
+    *,
+    retention: float = 7 * 86400,
+    key: Callable[[Invocation], str] = default_cache_key,
+):
+    """Conditional revalidation middleware.
+
+    Caches raw GET responses carrying `ETag` or `Last-Modified` validators. Within the rule ttl
+    (in seconds) the cached response is returned without requesting, afterwards the request is sent
+    with `If-None-Match` / `If-Modified-Since`. On `304 Not Modified` the cached response is returned
+    with the validators and caching headers of the 304 response, and its ttl is refreshed without
+    downloading the body again. A ttl of 0 revalidates on every invocation, a negative ttl bypasses
+    the middleware (default).
+
+    Should be positioned after `http_error_middleware` and before rate limiter middlewares (if any)
+    in the client middlewares list. Entries are stored under `"rv:"` prefixed keys and kept for
+    `retention` seconds past their ttl, a cache can be shared with `cache_middleware` in front of it.
+
+    Example:
+    ```python
+    CDragonClient(middlewares=[
+        cache_middleware(MemoryCache(), [(lambda inv: True, 3600)]),
+        json_response_middleware(orjson.loads),
+        http_error_middleware(),
+        revalidation_middleware(DiskCache("folder"), [(lambda inv: True, 0)]),
+    ])
+    ```
+
+    Parameters:
+        cache: Cache instance.
+        rules: Revalidation rules, defined by a list of (condition, ttl) or a dict of invoker name to ttl.
+        retention: Time in seconds responses are kept for revalidation after their ttl.
+        key: Function building the cache key of an invocation, e.g. `canonical_cache_key()`.
+    """
+
+    match = _rule_matcher(rules, -1)
+    build_key = key
+
+    def constructor(next: MiddlewareCallable):
+
+        async def middleware(invocation: Invocation):
+            if invocation.method != "GET":
+                return await next(invocation)
+            ttl, *_ = match(invocation)
+            if ttl < 0:
+                return await next(invocation)
+            key = "rv:" + build_key(invocation)
+            try:
+                cached: _Validated | None = await cache.get(key)
+            except KeyError:
+                cached = None
+            if cached is not None:
+                if time.time() < cached.fresh_until:
+                    return cached.response
+                headers = dict(invocation.params.get("headers", {}))
+                if etag := cached.response.headers.get("ETag"):
+                    headers["If-None-Match"] = etag
+                if last_modified := cached.response.headers.get("Last-Modified"):
+                    headers["If-Modified-Since"] = last_modified
+                invocation.params["headers"] = headers
+            response = await next(invocation)
+            if cached is not None and response.status == 304:
+                if isinstance(response, aiohttp.ClientResponse):
+                    response.release()
+                headers = multidict.CIMultiDict(cached.response.headers)
+                for name in _REVALIDATED_HEADERS:
+                    if name in response.headers:
+                        headers[name] = response.headers[name]
+                response = CachedResponse(
+                    cached.response.method, cached.response.url, cached.response.status,
+                    cached.response.reason, headers, cached.response.body,
+                )
+                await cache.set(key, _Validated(response, time.time() + ttl), ttl + retention)
+                return response
+            if response.status != 200 or not ("ETag" in response.headers or "Last-Modified" in response.headers):
+                return response
+            if isinstance(response, aiohttp.ClientResponse):
+                response = await CachedResponse.from_response(response)
+            await cache.set(key, _Validated(response, time.time() + ttl), ttl + retention)
+            return response
+
+        return middleware
+
+    return constructor
+
+
+async def cdragon_patch_resolver(invocation: Invocation, base_url: str) -> str:
+    """Resolve the latest CDragon patch (e.g. `"14.20"`) from `content-metadata.json`."""
+    if invocation.session is None:
+        raise RuntimeError("session is None, cannot resolve patch")
+    async with invocation.session.get(f"{base_url}/latest/content-metadata.json") as response:
+        response.raise_for_status()
+        metadata = await response.json(content_type=None)
+    return ".".join(metadata["version"].split(".")[:2])
+
+
+async def ddragon_patch_resolver(invocation: Invocation, base_url: str) -> str:
+    """Resolve the latest DDragon version (e.g. `"14.20.1"`) from the first entry of `api/versions.json`."""
+    if invocation.session is None:
+        raise RuntimeError("session is None, cannot resolve patch")
+    async with invocation.session.get(str(yarl.URL(base_url).with_path("/api/versions.json"))) as response:
+        response.raise_for_status()
+        versions = await response.json(content_type=None)
+    return versions[0]
+
+
+def _default_patch_resolver(base_url: str) -> Callable[[Invocation, str], Awaitable[str]] | None:
+    """Return the patch resolver of a base URL by host, None if the host has none."""
+    host = yarl.URL(base_url).host or ""
+    if host == "communitydragon.org" or host.endswith(".communitydragon.org"):
+        return cdragon_patch_resolver
+    if host == "ddragon.leagueoflegends.com":
+        return ddragon_patch_resolver
+    return None
+
+
+class _NegativeEntry(NamedTuple):
+    """Cached HTTP error of a negative cache rule."""
+
+    status: int
+    message: str
+
+
+def negative_cache_middleware(
+    cache: BaseCache,
+    rules: list[tuple[Callable[[Invocation], bool], float]] | dict[str, float],
+    counter: collections.Counter[str] | None = None,
+    *,
+    statuses: tuple[int, ...] = (404,),
+    key: Callable[[Invocation], str] = default_cache_key,
+):
+    """Negative cache middleware.
+
+    Remembers `aiohttp.ClientResponseError` of the given statuses (e.g. probing players not in game,
+    deleted matches) for the rule ttl (in seconds), replaying the error without performing the request.
+    Number of requests avoided is recorded in `counter["negative_cached"]`. Opt-in per rule, invocations
+    not matching any rule are not cached.
+
+    Should be positioned before `http_error_middleware` in the client middlewares list. Errors are stored
+    under `"neg:"` prefixed keys, a cache can be shared with `cache_middleware`.
+
+    Example:
+    ```python
+    counter = collections.Counter()
+    RiotAPIClient(middlewares=[
+        negative_cache_middleware(MemoryCache(), {
+            "get_lol_spectator_v5_active_game_by_summoner": 60,
+            "get_lol_match_v5_match": 3600,
+        }, counter),
+        json_response_middleware(),
+        http_error_middleware(),
+        rate_limiter_middleware(RiotAPIRateLimiter()),
+    ])
+    ...
+    counter["negative_cached"] # Number of requests avoided
+    ```
+
+    Parameters:
+        cache: Cache instance.
+        rules: Negative cache rules, defined by a list of (condition, ttl) or a dict of invoker name to ttl.
+        counter: Counter for recording number of avoided requests.
+        statuses: HTTP statuses to be cached.
+        key: Function building the cache key of an invocation, e.g. `canonical_cache_key()`.
+    """
+
+    match = _rule_matcher(rules)
+    build_key = key
+
+    def constructor(next: MiddlewareCallable):
+
+        async def middleware(invocation: Invocation):
+            ttl, *_ = match(invocation)
+            if ttl <= 0:
+                return await next(invocation)
+            key = "neg:" + build_key(invocation)
+            try:
+                entry = await cache.get(key)
+            except KeyError:
+                entry = None
+            if isinstance(entry, _NegativeEntry):
+                if counter is not None:
+                    counter["negative_cached"] += 1
+                url = yarl.URL(invocation.url)
+                raise aiohttp.ClientResponseError(
+                    aiohttp.RequestInfo(url, invocation.method, multidict.CIMultiDictProxy(multidict.CIMultiDict()), url),
+                    (),
+                    status=entry.status,
+                    message=entry.message,
+                )
+            try:
+                return await next(invocation)
+            except aiohttp.ClientResponseError as exc:
+                if exc.status in statuses:
+                    await cache.set(key, _NegativeEntry(exc.status, exc.message), ttl)
+                raise
+
+        return middleware
+
+    return constructor
+
+
+def patch_resolver_middleware(
+    resolver: Callable[[Invocation, str], Awaitable[str]] | None = None,
+    ttl: float = 600,
+    *,
+    alias: str = "latest",
+    failure_ttl: float = 30,
+):
+    """Patch resolver middleware.
+
+    Rewrites the `patch` param of invocations from `alias` to the concrete patch returned by `resolver`,
+    resolved once per base URL every `ttl` seconds. Responses of concrete patches never change and can
+    be cached indefinitely, new patches change the cache keys instead. If a resolution fails, a warning
+    is logged and the last resolved patch is kept, if none was resolved yet the alias is kept as is
+    and resolution is retried after `failure_ttl` seconds.
+
+    Should be positioned before cache middlewares in the client middlewares list. `resolver` receives
+    the invocation and the base URL (`urlformat` up to `{patch}`). If None, the resolver is chosen by
+    host: `cdragon_patch_resolver` for CommunityDragon, `ddragon_patch_resolver` for
+    `ddragon.leagueoflegends.com`, other base URLs are left untouched (e.g. `dd.b.pvp.net` of
+    `DDragonClient` serves `latest` itself).
+
+    Example:
+    ```python
+    CDragonClient(middlewares=[
+        patch_resolver_middleware(ttl=600),
+        cache_middleware(DiskCache("folder"), [(lambda inv: True, float("inf"))]),
+        json_response_middleware(),
+        http_error_middleware(),
+    ])
+    ```
+
+    Parameters:
+        resolver: Coroutine function resolving the concrete patch of a base URL.
+        ttl: Time in seconds a resolved patch is reused before resolving again.
+        alias: Patch alias to be rewritten.
+        failure_ttl: Time in seconds before retrying a failed first resolution.
+    """
+
+    resolved: dict[str, tuple[str, float]] = {}
+    inflight: dict[str, asyncio.Future] = {}
+
+    async def resolve(invocation: Invocation, base_url: str) -> str:
+        try:
+            patch = await (resolver or _default_patch_resolver(base_url))(invocation, base_url)
+        except Exception:
+            LOGGER.warning(f"patch_resolver_middleware: failed to resolve patch of {base_url}", exc_info=True)
+            if base_url not in resolved or resolved[base_url][0] == alias:
+                resolved[base_url] = (alias, time.time() + failure_ttl)
+                return alias
+            patch = resolved[base_url][0]
+        resolved[base_url] = (patch, time.time() + ttl)
+        return patch
+
+    def constructor(next: MiddlewareCallable):
+
+        async def middleware(invocation: Invocation):
+            if invocation.params.get("patch") != alias or "{patch}" not in invocation.urlformat:
+                return await next(invocation)
+            base_url = invocation.urlformat.split("{patch}", 1)[0].rstrip("/")
+            entry = resolved.get(base_url)
+            if entry is None and resolver is None and _default_patch_resolver(base_url) is None:
+                entry = resolved[base_url] = (alias, math.inf)
+            if entry is not None and time.time() < entry[1]:
+                patch = entry[0]
+            else:
+                patch = await _single_flight(inflight, base_url, lambda: resolve(invocation, base_url))
+            if patch != alias:
+                invocation.params = {**invocation.params, "patch": patch}
+            return await next(invocation)
 
         return middleware
 
@@ -180,7 +784,7 @@ def rate_limiter_middleware(rate_limiter: BaseRateLimiter):
                 wait_for = await rate_limiter.acquire(invocation)
                 if wait_for <= 0:
                     break
-                await asyncio.sleep(wait_for)
+                await rate_limiter.wait(invocation, wait_for)
 
             response: aiohttp.ClientResponse = await next(invocation)
 
@@ -1,10 +1,12 @@
 from typing import NoReturn
 import abc
-import collections
+import asyncio
+import heapq
 import random
 import time
 
 from .invocation import Invocation
+from .taskgroups import parked
 
 
 class BaseRateLimiter(abc.ABC):
@@ -28,6 +30,69 @@ class BaseRateLimiter(abc.ABC):
     async def synchronize(self, invocation: Invocation, headers: dict[str, str]) -> None:
         """Synchronize rate limiting headers to index."""
 
+    async def wait(self, invocation: Invocation, wait_for: float) -> None:
+        """Wait before acquiring again, given the wait_for value returned by `acquire`.
+
+        Sleeps for wait_for seconds by default, override to wake waiters as soon as capacity exists.
+        The task group slot of the waiting task is released meanwhile if allowed (see `parked`).
+        """
+        async with parked():
+            await asyncio.sleep(wait_for)
+
+
+def _parse_limits(value: str) -> list[tuple[int, int]]:
+    """Parse a rate limit header value (e.g. `"20:1,100:120"`) into (requests, seconds) pairs."""
+    return [(int(requests), int(seconds)) for requests, seconds in (t.split(':') for t in value.split(','))]
+
+
+class _Bucket:
+    """Rate limit bucket of a scope and window, updated in place."""
+
+    __slots__ = (
+        "scope", "window", "count", "limit", "expire", "latency", "pinged",
+        "optimistic", "known_limit", "known_seconds", "waiters", "timer",
+    )
+
+    def __init__(self, scope: str, window: int) -> None:
+        self.scope = scope
+        self.window = window
+        self.count = 0
+        self.limit = 0
+        self.expire = 0.0
+        self.latency = 0.0
+        self.pinged = 0.0
+        self.optimistic = False
+        self.known_limit = 0
+        self.known_seconds = 0
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.timer: tuple[float, asyncio.AbstractEventLoop, asyncio.TimerHandle] | None = None
+
+    def reset(self, pinged: float = 0.0) -> None:
+        self.count = self.limit = 0
+        self.expire = self.latency = 0.0
+        self.pinged = pinged
+        self.optimistic = False
+
+    def open(self, request_time: float, burst: float) -> None:
+        """Open a window of known limits, allowing a burst until synchronized with the actual count."""
+        self.count = 0
+        self.limit = max(1, int(self.known_limit * burst))
+        self.expire = request_time + self.known_seconds
+        self.pinged = 0.0
+        self.optimistic = True
+
+
+class _BucketRegistry:
+    """Buckets and seeded limits of the rate limiters sharing them."""
+
+    __slots__ = ("seeds", "plans", "app_plans", "waiting")
+
+    def __init__(self) -> None:
+        self.seeds: dict[str, list[tuple[int, int]]] = {}
+        self.plans: dict[str, dict[str, dict[str, tuple[_Bucket, _Bucket, _Bucket, _Bucket]]]] = {}
+        self.app_plans: dict[str, dict[str, tuple[_Bucket, _Bucket]]] = {}
+        self.waiting: set[_Bucket] = set()
+
 
 class RiotAPIRateLimiter(BaseRateLimiter):
     """Riot API rate limiter.
@@ -35,6 +100,20 @@ class RiotAPIRateLimiter(BaseRateLimiter):
     This rate limiter can be served stand-alone for centralized rate limiting,
     also accepting proxy configuration towards said centralized rate limiter.
 
+    Locally, waiting invocations are parked per rate limit bucket instead of polling. A bucket wakes
+    one waiter when its window resets and, once synchronized, as many waiters as it has free slots.
+    Waiters are woken by `Invocation.priority` then in order of creation, invocations do not overtake
+    waiters ahead of them in the same bucket.
+
+    A bucket of unknown limits is pinged by a single request before others proceed. Once its limits
+    are known, learned from responses or seeded with `limits`, new windows open optimistically: up to
+    `burst` of the limit is requested before the first response arrives, then the count is reconciled
+    against the `X-*-Rate-Limit-Count` headers, accounting for requests still in flight.
+
+    Buckets, seeded and learned limits are shared by all rate limiters of the process. Pass
+    `shared=False` to keep them per instance instead, e.g. for rate limiters of different API keys
+    in the same process. Across processes, proxy to a served rate limiter.
+
     Example:
     ```python
     RiotAPIRateLimiter() # Local rate limiter
@@ -48,20 +127,51 @@ class RiotAPIRateLimiter(BaseRateLimiter):
     RiotAPIRateLimiter(proxy="http://127.0.0.1:12227", proxy_secret=<SECRET>) # Proxy authentication
     RiotAPIRateLimiter(proxy="<SCHEME>://<HOST>:<PORT>")
     RiotAPIRateLimiter(proxy="<SCHEME>://<HOST>:<PORT>", proxy_secret=<SECRET>)
+
+    RiotAPIRateLimiter(limits={ # Seed known limits, in the format of rate limit headers
+        "app": "20:1,100:120",
+        "https://{region}.api.riotgames.com/lol/match/v5/matches/{id}": "2000:10",
+    })
+    RiotAPIRateLimiter(limits=json.load(f)) # Seed limits persisted by a previous run
+    json.dump(rate_limiter.export_limits(), f)
     ```
 
     Parameters:
         proxy: URL of the proxy rate limiter.
         proxy_secret: Secret of the proxy rate limiter if required.
+        limits: Known rate limits, keyed by `"app"` or by urlformat for method limits.
+            Raises `ValueError` if conflicting with the limits seeded by another shared rate limiter.
+        burst: Fraction of a known limit requested before synchronizing a new window.
+        shared: Share buckets and limits with the other shared rate limiters of the process.
     """
 
-    _index: dict[tuple[str, int, *tuple[str]], tuple[int, int, float, float, float]] = \
-        collections.defaultdict(lambda: (0, 0, 0, 0, 0))
+    _registry = _BucketRegistry()
 
-    def __init__(self, *, proxy: str | None = None, proxy_secret: str | None = None) -> None:
+    def __init__(
+        self,
+        *,
+        proxy: str | None = None,
+        proxy_secret: str | None = None,
+        limits: dict[str, str] | None = None,
+        burst: float = 0.5,
+        shared: bool = True,
+    ) -> None:
         self.proxy = proxy
         self.proxy_secret = proxy_secret
-        self._track_syncs: dict[str, tuple[float, list]] = {}
+        self.burst = burst
+        self._registry = self._registry if shared else _BucketRegistry()
+        self._plans = self._registry.plans # Shortcut of the registry, acquiring looks up plans first
+        seeds = {key: _parse_limits(value) for key, value in (limits or {}).items()}
+        for key, value in seeds.items():
+            if self._registry.seeds.get(key, value) != value:
+                raise ValueError(f"Limits of {key!r} conflict with the limits seeded by another rate limiter")
+        if seeds.keys() - self._registry.seeds.keys():
+            self._registry.seeds.update(seeds)
+            for urlformat, method_plans in self._registry.plans.items():
+                for region_plans in method_plans.values():
+                    for buckets in region_plans.values():
+                        self._seed(buckets, urlformat)
+        self._track_syncs: dict[int | str, tuple[float, list[tuple[_Bucket, int]]]] = {}
 
     async def acquire(self, invocation: Invocation) -> float:
         if self.proxy:
@@ -79,38 +189,83 @@ class RiotAPIRateLimiter(BaseRateLimiter):
             )
             response.raise_for_status()
             return await response.json()
+        return self._acquire(invocation, invocation.seq)
 
+    def _acquire(self, invocation: Invocation, track_key: int | str) -> float:
+        """Acquire locally, tracking synchronization by `Invocation.seq`, or by uid if served."""
         wait_for = 0
-        pinging_targets = []
-        requesting_targets = []
+        tracking = False
         request_time = time.time()
-        for target in [
-            ("app", 0, invocation.params.get("region", ""), invocation.method),
-            ("app", 1, invocation.params.get("region", ""), invocation.method),
-            ("method", 0, invocation.params.get("region", ""), invocation.method, invocation.urlformat),
-            ("method", 1, invocation.params.get("region", ""), invocation.method, invocation.urlformat),
-        ]:
-            count, limit, expire, latency, pinged = self._index[target]
-            pinging = pinged and request_time - pinged < 10
-            if pinging:
-                wait_for = max(wait_for, 0.1)
-            elif request_time > expire:
-                pinging_targets.append(target)
-            elif request_time > expire - latency * 1.1 + 0.01 or count >= limit:
-                wait_for = max(wait_for, expire - request_time)
-            else:
-                requesting_targets.append(target)
-        if wait_for <= 0:
-            if pinging_targets:
-                self._track_syncs[invocation.uid] = (request_time, pinging_targets)
-                for pinging_target in pinging_targets:
-                    self._index[pinging_target] = (0, 0, 0, 0, time.time())
-                wait_for = -1
-            for requesting_target in requesting_targets:
-                count, *values = self._index[requesting_target]
-                self._index[requesting_target] = (count + 1, *values)
+        buckets = self._plan(invocation)
+        if self._registry.waiting and self._queued_bucket(invocation, buckets) is not None:
+            return 0.1
+        for bucket in buckets:
+            if bucket.pinged and request_time - bucket.pinged < 10:
+                if wait_for < 0.1:
+                    wait_for = 0.1
+            elif request_time > bucket.expire:
+                tracking = True
+            elif request_time > bucket.expire - bucket.latency * 1.1 + 0.01 or bucket.count >= bucket.limit:
+                if wait_for < bucket.expire - request_time:
+                    wait_for = bucket.expire - request_time
+            elif bucket.optimistic:
+                tracking = True
+        if wait_for > 0:
+            return wait_for
+        for bucket in buckets:
+            if request_time > bucket.expire:
+                if bucket.known_limit:
+                    bucket.open(request_time, self.burst)
+                else:
+                    bucket.reset(request_time)
+            if not bucket.pinged:
+                bucket.count += 1
+        if tracking:
+            # Pinging and optimistic buckets synchronize with the response, the count sent so far is
+            # recorded to account for the requests still in flight when the response arrives
+            self._track_syncs[track_key] = (
+                request_time,
+                [(bucket, bucket.count) for bucket in buckets if bucket.pinged or bucket.optimistic],
+            )
+            wait_for = -1
         return wait_for
 
+    async def wait(self, invocation: Invocation, wait_for: float) -> None:
+        if self.proxy:
+            return await super().wait(invocation, wait_for)
+
+        request_time = time.time()
+        buckets = self._plan(invocation)
+        blocking_bucket, deadline = None, request_time
+        for bucket in buckets:
+            if bucket.pinged and request_time - bucket.pinged < 10:
+                bucket_deadline = bucket.pinged + 10 # Fallback if the pinging response never synchronizes
+            elif request_time > bucket.expire:
+                continue
+            elif request_time > bucket.expire - bucket.latency * 1.1 + 0.01 or bucket.count >= bucket.limit:
+                bucket_deadline = bucket.expire
+            else:
+                continue
+            if bucket_deadline > deadline:
+                blocking_bucket, deadline = bucket, bucket_deadline
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if blocking_bucket is None:
+            # Capacity exists but waiters are ahead, queue behind them and hand the capacity to the first
+            queued_bucket = self._queued_bucket(invocation, buckets)
+            if queued_bucket is None:
+                return
+            heapq.heappush(queued_bucket.waiters, (invocation.priority, invocation.seq, future))
+            self._registry.waiting.add(queued_bucket)
+            self._wake(queued_bucket, 1)
+            self._schedule(queued_bucket, request_time + 0.1) # In case the woken waiter parks elsewhere
+        else:
+            heapq.heappush(blocking_bucket.waiters, (invocation.priority, invocation.seq, future))
+            self._registry.waiting.add(blocking_bucket)
+            self._schedule(blocking_bucket, deadline)
+        async with parked():
+            await future
+
     async def synchronize(self, invocation: Invocation, headers: dict[str, str]) -> None:
         if self.proxy:
             response = await invocation.session.post(
@@ -127,41 +282,136 @@ class RiotAPIRateLimiter(BaseRateLimiter):
                 headers=self.proxy_secret and {"Authorization": "Bearer " + self.proxy_secret}
             )
             return response.raise_for_status()
+        self._synchronize(headers, invocation.seq)
 
+    def _synchronize(self, headers: dict[str, str], track_key: int | str) -> None:
+        """Synchronize locally the buckets tracked by `_acquire`."""
         response_time = time.time()
-        request_time, pinging_targets = self._track_syncs.pop(invocation.uid, [None, None])
+        request_time, tracked_buckets = self._track_syncs.pop(track_key, [None, None])
         if request_time is None:
             return
 
         if random.random() < 0.1:
-            for prev_uid, (prev_request_time, _) in list(self._track_syncs.items()):
+            for prev_key, (prev_request_time, _) in list(self._track_syncs.items()):
                 if response_time - prev_request_time > 600:
-                    self._track_syncs.pop(prev_uid, None)
+                    self._track_syncs.pop(prev_key, None)
 
         try:
             header_limits = {
-                "app": [[int(v) for v in t.split(':')] for t in headers["X-App-Rate-Limit"].split(',')],
-                "method": [[int(v) for v in t.split(':')] for t in headers["X-Method-Rate-Limit"].split(',')],
+                "app": _parse_limits(headers["X-App-Rate-Limit"]),
+                "method": _parse_limits(headers["X-Method-Rate-Limit"]),
             }
             header_counts = {
-                "app": [[int(v) for v in t.split(':')] for t in headers["X-App-Rate-Limit-Count"].split(',')],
-                "method": [[int(v) for v in t.split(':')] for t in headers["X-Method-Rate-Limit-Count"].split(',')],
+                "app": _parse_limits(headers["X-App-Rate-Limit-Count"]),
+                "method": _parse_limits(headers["X-Method-Rate-Limit-Count"]),
             }
         except KeyError:
-            for pinging_target in pinging_targets:
-                self._index[pinging_target] = (0, 0, 0, 0, 0)
+            for bucket, _ in tracked_buckets:
+                if bucket.pinged == request_time: # Optimistic buckets wait for other responses
+                    bucket.reset()
+                    self._wake(bucket, 1)
             return
-        for scope, idx, *subscopes in pinging_targets:
-            if idx >= len(header_limits[scope]):
-                self._index[(scope, idx, *subscopes)] = (0, 10**10, response_time + 3600, 0, 0)
+        for bucket, sent in tracked_buckets:
+            if bucket.pinged != request_time and not bucket.optimistic:
+                continue # Already synchronized by another response
+            limits, counts = header_limits[bucket.scope], header_counts[bucket.scope]
+            if bucket.window >= len(limits):
+                bucket.count, bucket.limit, bucket.expire = 0, 10**10, response_time + 3600
+                bucket.latency = bucket.pinged = 0
+                bucket.optimistic = False
+                bucket.known_limit, bucket.known_seconds = 10**10, 3600
+                self._wake(bucket, 10**10)
                 continue
-            self._index[(scope, idx, *subscopes)] = (
-                header_counts[scope][idx][0],
-                header_limits[scope][idx][0],
-                header_limits[scope][idx][1] + response_time,
-                response_time - request_time,
-                0
-            )
+            bucket.known_limit, bucket.known_seconds = limits[bucket.window]
+            bucket.count = counts[bucket.window][0] + bucket.count - sent
+            bucket.limit = bucket.known_limit
+            bucket.expire = bucket.known_seconds + response_time
+            bucket.latency = response_time - request_time
+            bucket.pinged = 0
+            bucket.optimistic = False
+            self._wake(bucket, bucket.limit - bucket.count)
+            if bucket.waiters:
+                self._schedule(bucket, bucket.expire, True)
+
+    def export_limits(self) -> dict[str, str]:
+        """Export the rate limits learned so far, to seed the `limits` of another rate limiter."""
+        limits = {}
+        for urlformat, method_plans in self._registry.plans.items():
+            for region_plans in method_plans.values():
+                for buckets in region_plans.values():
+                    for key, scope_buckets in (("app", buckets[:2]), (urlformat, buckets[2:])):
+                        value = ",".join(
+                            f"{bucket.known_limit}:{bucket.known_seconds}"
+                            for bucket in scope_buckets if 0 < bucket.known_limit < 10**10
+                        )
+                        if value:
+                            limits[key] = value
+        return limits
+
+    def _plan(self, invocation: Invocation) -> tuple[_Bucket, _Bucket, _Bucket, _Bucket]:
+        """Return the app and method buckets of an invocation, created once per urlformat, method and region."""
+        region = invocation.params.get("region", "")
+        # Nested lookups of the invocation strings, acquiring does not allocate a key
+        try:
+            return self._plans[invocation.urlformat][invocation.method][region]
+        except KeyError:
+            pass
+        app_plans = self._registry.app_plans.setdefault(invocation.method, {})
+        app_buckets = app_plans.get(region)
+        if app_buckets is None:
+            app_buckets = app_plans[region] = (_Bucket("app", 0), _Bucket("app", 1))
+        buckets = (*app_buckets, _Bucket("method", 0), _Bucket("method", 1))
+        self._plans.setdefault(invocation.urlformat, {}).setdefault(invocation.method, {})[region] = buckets
+        self._seed(buckets, invocation.urlformat)
+        return buckets
+
+    def _seed(self, buckets: tuple[_Bucket, _Bucket, _Bucket, _Bucket], urlformat: str) -> None:
+        """Seed the known limits of buckets not yet synchronized."""
+        for key, scope_buckets in (("app", buckets[:2]), (urlformat, buckets[2:])):
+            if key not in self._registry.seeds:
+                continue
+            seeds = self._registry.seeds[key] + [(10**10, 3600)] # Windows not listed are unlimited
+            for bucket, (limit, seconds) in zip(scope_buckets, seeds):
+                if not bucket.known_limit:
+                    bucket.known_limit, bucket.known_seconds = limit, seconds
+
+    def _queued_bucket(self, invocation: Invocation, buckets: tuple[_Bucket, ...]) -> _Bucket | None:
+        """Return a bucket with waiters ahead of the invocation, None if there is none."""
+        for bucket in buckets:
+            waiters = bucket.waiters
+            while waiters and waiters[0][2].done():
+                heapq.heappop(waiters)
+            if not waiters:
+                self._registry.waiting.discard(bucket)
+            elif waiters[0][:2] < (invocation.priority, invocation.seq):
+                return bucket
+        return None
+
+    def _schedule(self, bucket: _Bucket, deadline: float, replace: bool = False) -> None:
+        """Schedule waking a waiter of a bucket at deadline, unless an earlier wake is scheduled."""
+        loop = asyncio.get_running_loop()
+        scheduled_deadline, timer_loop, timer = bucket.timer or (None, None, None)
+        if replace or timer is None or timer_loop is not loop or scheduled_deadline > deadline:
+            if timer is not None:
+                timer.cancel()
+            timer = loop.call_at(loop.time() + deadline - time.time(), self._wake, bucket, 1, True)
+            bucket.timer = (deadline, loop, timer)
+
+    def _wake(self, bucket: _Bucket, n: int, deadline: bool = False) -> None:
+        """Wake up to n waiters of a bucket, in order of priority then creation."""
+        if deadline:
+            bucket.timer = None
+        waiters = bucket.waiters
+        while waiters and n > 0:
+            _, _, future = heapq.heappop(waiters)
+            if not future.done() and not future.get_loop().is_closed():
+                future.set_result(None)
+                n -= 1
+        if not waiters:
+            self._registry.waiting.discard(bucket)
+        elif deadline:
+            # Woken waiters may park on other buckets or be cancelled, keep waking one per second
+            self._schedule(bucket, time.time() + 1)
 
     def serve(self, host="127.0.0.1", port=12227, *, secret: str | None = None) -> NoReturn:
         from aiohttp import web
@@ -181,7 +431,8 @@ class RiotAPIRateLimiter(BaseRateLimiter):
                 return web.Response(status=401)
             try:
                 data = await request.json()
-                wait_for = await self.acquire(Invocation(**data["invocation"]))
+                invocation = Invocation(**data["invocation"])
+                wait_for = self._acquire(invocation, invocation.uid) # Invocations differ per request
                 return web.json_response(wait_for)
             except (KeyError, ValueError):
                 return web.Response(status=400)
@@ -192,7 +443,7 @@ class RiotAPIRateLimiter(BaseRateLimiter):
                 return web.Response(status=401)
             try:
                 data = await request.json()
-                await self.synchronize(Invocation(**data["invocation"]), data["headers"])
+                self._synchronize(data["headers"], data["invocation"]["uid"])
                 return web.Response()
             except (KeyError, ValueError):
                 return web.Response(status=400)
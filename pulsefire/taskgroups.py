@@ -3,9 +3,10 @@
 This module contains adaptations of `asyncio.taskgroups` better fit to use cases of pulsefire.
 """
 
-from contextvars import Context
-from typing import Awaitable, override
+from contextvars import Context, ContextVar
+from typing import AsyncIterator, Awaitable, override
 import asyncio
+import contextlib
 import logging
 import traceback
 
@@ -13,6 +14,49 @@ import traceback
 LOGGER = logging.getLogger("pulsefire.taskgroups")
 
 
+class _Slot:
+    """Semaphore slot held by a task of a task group."""
+
+    __slots__ = ("task", "semaphore", "parking", "held")
+
+    def __init__(self, semaphore: asyncio.Semaphore, parking: asyncio.Semaphore | None) -> None:
+        self.task = asyncio.current_task()
+        self.semaphore = semaphore
+        self.parking = parking
+        self.held = True
+
+
+_slot: ContextVar[_Slot | None] = ContextVar("pulsefire_taskgroup_slot", default=None)
+
+
+@contextlib.asynccontextmanager
+async def parked() -> AsyncIterator[None]:
+    """Release the semaphore slot of the current task group task while blocked within the context.
+
+    Used by rate limiters while waiting, a slot is only released if the task group has a `parking`
+    semaphore with room, and is acquired back before leaving the context.
+
+    Example:
+    ```python
+    async with parked():
+        await asyncio.sleep(wait_for)
+    ```
+    """
+    slot = _slot.get()
+    if slot is None or slot.parking is None or slot.task is not asyncio.current_task() or slot.parking.locked():
+        yield
+        return
+    await slot.parking.acquire()
+    slot.semaphore.release()
+    slot.held = False
+    try:
+        yield
+    finally:
+        slot.parking.release()
+        await slot.semaphore.acquire()
+        slot.held = True
+
+
 class TaskGroup(asyncio.TaskGroup):
     """Asynchronous context manager for managing groups of tasks.
     See [python asyncio task groups documentation](https://docs.python.org/3/library/asyncio-task.html#task-groups).
@@ -20,6 +64,7 @@ class TaskGroup(asyncio.TaskGroup):
     Adapted for pulsefire, key differences from `asyncio.TaskGroup`:
 
     - Accepts a semaphore to restrict the amount of concurrent running coroutines.
+    - Accepts a parking semaphore, tasks blocked by rate limits give their slot to runnable tasks.
     - Due to semaphore support, the `create_task` method is now async.
     - Allows internal collection of results and exceptions, similar to `asyncio.Task`.
     - If exception collection is on (default), the task group will not abort on task exceptions.
@@ -29,11 +74,18 @@ class TaskGroup(asyncio.TaskGroup):
     async with TaskGroup(asyncio.Semaphore(100)) as tg:
         await tg.create_task(coro_func(...))
     results = tg.results()
+
+    # Up to 100 requesting and 10000 waiting for rate limits, other regions are not blocked.
+    async with TaskGroup(asyncio.Semaphore(100), parking=asyncio.Semaphore(10000)) as tg:
+        for region, match_id in match_ids:
+            await tg.create_task(client.get_lol_match_v5_match(region=region, id=match_id))
     ```
     """
 
     semaphore: asyncio.Semaphore | None = None
     """Semaphore for restricting concurrent running coroutines."""
+    parking: asyncio.Semaphore | None = None
+    """Semaphore for restricting tasks that released their `semaphore` slot while blocked (see `parked`)."""
     collect_results: bool = True
     """Flag for collecting task results."""
     collect_exceptions: bool = True
@@ -43,11 +95,13 @@ class TaskGroup(asyncio.TaskGroup):
         self,
         semaphore: asyncio.Semaphore | None = None,
         *,
+        parking: asyncio.Semaphore | None = None,
         collect_results: bool = True,
         collect_exceptions: bool = True,
     ) -> None:
         super().__init__()
         self.semaphore = semaphore
+        self.parking = parking
         self.collect_results = collect_results
         self.collect_exceptions = collect_exceptions
         self._exceptions: list[BaseException] = []
@@ -75,15 +129,19 @@ class TaskGroup(asyncio.TaskGroup):
         """Create a new task in this group and return it.
 
         If this group has a semaphore, wrap this semaphore on the coroutine.
+        The slot may be released while the task is `parked`.
         """
         _coro = coro
         if self.semaphore:
             await self.semaphore.acquire()
             async def semaphored():
+                slot = _Slot(self.semaphore, self.parking)
+                _slot.set(slot)
                 try:
                     return await _coro
                 finally:
-                    self.semaphore.release()
+                    if slot.held:
+                        self.semaphore.release()
             coro = semaphored()
         return super().create_task(coro, name=name, context=context)
 
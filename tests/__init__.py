@@ -1,9 +1,13 @@
 from typing import Callable
+import asyncio
+import collections
 import inspect
 import functools
 import os
 import json
+import time
 
+from pulsefire.caches import CachedResponse
 from pulsefire.clients import (
     BaseClient,
     CDragonClient,
@@ -12,6 +16,74 @@ from pulsefire.clients import (
     MerakiCDNClient,
     RiotAPIClient,
 )
+from pulsefire.invocation import Invocation
+from pulsefire.middlewares import MiddlewareCallable
+
+
+class MockClient(BaseClient):
+    """Client of a mock API, responses are returned by the mock middlewares of each test."""
+
+    def __init__(self, *, base_url: str = "https://mock.pulsefire.dev", middlewares: list = []) -> None:
+        super().__init__(base_url=base_url, middlewares=middlewares)
+
+    async def get_champion(self, *, id: int = ...):
+        return await self.invoke("GET", "/champions/{id}")
+
+    async def get_item(self, *, id: int = ...):
+        return await self.invoke("GET", "/items/{id}")
+
+    async def get_items(self, *, patch: str = "latest"):
+        return await self.invoke("GET", "/{patch}/items.json")
+
+    async def get_match(self, *, region: str = ..., id: str = ...):
+        return await self.invoke("GET", "/matches/{id}")
+
+
+def short_circuit_middleware():
+    """Return the invocation instead of performing the request."""
+    def constructor(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            return invocation
+        return middleware
+    return constructor
+
+
+def mock_response_middleware(requests: list[str], delay: float = 0.1):
+    """Respond with the `id` param after delay, recording requested URLs. Raises `ValueError` on id 0."""
+    def constructor(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            requests.append(invocation.url)
+            await asyncio.sleep(delay)
+            if invocation.params.get("id") == 0:
+                raise ValueError(invocation.url)
+            return {"id": invocation.params.get("id")}
+        return middleware
+    return constructor
+
+
+def mock_riot_api_middleware(counter: collections.Counter, app_limit: tuple[int, int], latency: float = 0.05):
+    """Respond with rate limit headers of a fixed app window, counting requests and 429s."""
+    windows = {}
+
+    def constructor(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            await asyncio.sleep(latency)
+            region = invocation.params["region"]
+            started, count = windows.get(region, (time.time(), 0))
+            if time.time() - started > app_limit[1]:
+                started, count = time.time(), 0
+            windows[region] = (started, count + 1)
+            counter["requests"] += 1
+            counter["429"] += count + 1 > app_limit[0]
+            return CachedResponse("GET", invocation.url, 429 if count + 1 > app_limit[0] else 200, "", {
+                "X-App-Rate-Limit": f"{app_limit[0]}:{app_limit[1]}",
+                "X-App-Rate-Limit-Count": f"{count + 1}:{app_limit[1]}",
+                "X-Method-Rate-Limit": "10000:10",
+                "X-Method-Rate-Limit-Count": f"{count + 1}:10",
+            }, b"")
+        return middleware
+
+    return constructor
 
 
 def typechecked_client_responses(client_cls: type[BaseClient]):
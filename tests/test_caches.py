@@ -1,8 +1,29 @@
 import asyncio
+import contextlib
+import fcntl
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import tempfile
+
+import aiohttp
 
 from pulsefire.caches import (
+    BaseCache,
+    CachedResponse,
     MemoryCache,
-    DiskCache
+    DiskCache,
+    LFUPolicy,
+    ProxyCache,
+    SharedMemoryCache,
+    SQLiteCache,
+    TieredCache,
+    WTinyLFUPolicy,
+    ZlibCodec,
+    estimate_size,
 )
 from pulsefire.clients import CDragonClient
 from pulsefire.functools import async_to_sync
@@ -15,6 +36,20 @@ from pulsefire.middlewares import (
 )
 
 
+CACHE_SERVER_SCRIPT = (
+    "from pulsefire.caches import MemoryCache;"
+    "MemoryCache().serve(secret='sAmPLesECReT')"
+)
+
+UNDELETABLE_CACHE_SERVER_SCRIPT = (
+    "from pulsefire.caches import MemoryCache\n"
+    "class UndeletableCache(MemoryCache):\n"
+    "    async def delete_many(self, keys):\n"
+    "        raise NotImplementedError('UndeletableCache does not support deletion')\n"
+    "UndeletableCache().serve(port=12229)"
+)
+
+
 def detect_cache_expire_middleware(prev_urls: set[str]):
     def constructor(next: MiddlewareCallable):
         async def middleware(invocation: Invocation):
@@ -96,3 +131,351 @@ async def test_disk_cache():
             assert False, "Expected exception"
         except AssertionError:
             assert True
+
+
+@async_to_sync()
+async def test_memory_cache_bounded():
+    cache = MemoryCache(max_entries=3)
+    for key in ("a", "b", "c"):
+        await cache.set(key, key, 60)
+    await cache.get("a")
+    await cache.set("d", "d", 60) # evicts "b"
+    assert list(cache.cache) == ["c", "a", "d"]
+    try:
+        await cache.get("b")
+        assert False, "Expected exception"
+    except KeyError:
+        assert True
+
+    cache = MemoryCache()
+    for i in range(100):
+        await cache.set(str(i), i, 0.1)
+    await cache.set("inf", 0, float("inf"))
+    await asyncio.sleep(0.2)
+    for i in range(20):
+        await cache.set("new", i, 60)
+    assert len(cache.cache) == 2
+
+
+@async_to_sync()
+async def test_memory_cache_policies():
+    cache = MemoryCache(max_entries=3, policy=LFUPolicy())
+    for key in ("a", "b", "c"):
+        await cache.set(key, key, 60)
+    for key in ("a", "a", "c"):
+        await cache.get(key)
+    await cache.set("d", "d", 60) # evicts "b"
+    await cache.set("e", "e", 60) # evicts "d"
+    assert sorted(cache.cache) == ["a", "c", "e"]
+    await cache.delete_many(["a", "c", "e"])
+    assert not cache.policy.frequencies and not cache.policy.buckets
+
+    cache = MemoryCache(max_entries=100, policy=WTinyLFUPolicy())
+    hot = [f"hot{i}" for i in range(50)]
+    for _ in range(5):
+        for key in hot:
+            try:
+                await cache.get(key)
+            except KeyError:
+                await cache.set(key, key, 60)
+    for i in range(1000): # one-off scan
+        await cache.set(f"scan{i}", i, 60)
+    assert len(cache.cache) == 100
+    assert sum(key in cache.cache for key in hot) >= 45
+    await cache.clear()
+    assert not (cache.policy.window or cache.policy.probation or cache.policy.protected)
+
+
+@async_to_sync()
+async def test_memory_cache_max_bytes():
+    cache = MemoryCache(max_bytes=1000)
+    await cache.set("a", b"a" * 400, 60)
+    await cache.set("b", b"b" * 400, 60)
+    assert cache.bytes_used == 800
+    await cache.set("c", b"c" * 400, 60) # evicts "a"
+    assert cache.bytes_used == 800
+    assert list(cache.cache) == ["b", "c"]
+    await cache.set("d", b"d" * 2000, 60) # larger than budget
+    assert list(cache.cache) == ["b", "c"]
+    await cache.set("b", {"id": 777}, 60)
+    assert cache.bytes_used < 800
+    await cache.clear()
+    assert cache.bytes_used == 0
+    sized = []
+    cache = MemoryCache(sizer=lambda value: sized.append(value) or 0)
+    await cache.set("a", {"id": 777}, 60)
+    assert cache.bytes_used is None and not sized # Values are not sized without a budget
+
+
+def test_estimate_size():
+    assert estimate_size(b"x" * 2048) == 2048
+    assert estimate_size(CachedResponse("GET", "/", 200, "OK", {}, b"x" * 2048)) == 2048
+    value = {"metadata": {"id": "NA1_777"}, "frames": [{"id": i, "name": "x" * 20} for i in range(100000)]}
+    size = len(json.dumps(value))
+    assert size / 2 < estimate_size(value) < size * 2 # sampled, not walked
+    assert estimate_size({"id": 777}) < 100
+
+
+@async_to_sync()
+async def test_tiered_cache():
+    l2 = DiskCache("tests/__pycache__/diskcache-tiered")
+    await l2.clear()
+    cache = TieredCache(MemoryCache(max_entries=1), l2)
+    await cache.set("a", {"id": 1}, 60)
+    await cache.set("b", {"id": 2}, float("inf"))
+    assert await cache.get("b") == {"id": 2} # l1 hit
+    assert await cache.get("a") == {"id": 1} # l2 hit, promoted
+    assert await cache.get("a") == {"id": 1} # l1 hit
+    _, ttl = await cache.l1.get_with_ttl("a")
+    assert 0 < ttl <= 60
+    try:
+        await cache.get("c")
+        assert False, "Expected exception"
+    except KeyError:
+        assert True
+    assert (cache.l1_hits, cache.l2_hits, cache.misses) == (2, 1, 1)
+
+
+@async_to_sync()
+async def test_cache_unknown_ttl():
+
+    class DictCache(BaseCache):
+
+        def __init__(self) -> None:
+            self.cache = {}
+
+        async def get(self, key):
+            return self.cache[key]
+
+        async def set(self, key, value, ttl):
+            self.cache[key] = value
+
+        async def delete(self, key):
+            self.cache.pop(key, None)
+
+        async def clear(self):
+            self.cache.clear()
+
+    l2 = DictCache()
+    await l2.set("a", {"id": 1}, 60)
+    assert await l2.get_with_ttl("a") == ({"id": 1}, None)
+    cache = TieredCache(MemoryCache(), l2)
+    assert await cache.get("a") == {"id": 1}
+    assert "a" not in cache.l1.cache # Not promoted without a TTL bound
+    cache = TieredCache(MemoryCache(), l2, l1_ttl=10)
+    assert await cache.get_with_ttl("a") == ({"id": 1}, None)
+    _, ttl = await cache.l1.get_with_ttl("a")
+    assert 0 < ttl <= 10
+    await cache.delete_many(["a", "b"])
+    assert not l2.cache and not cache.l1.cache
+
+
+@async_to_sync()
+async def test_disk_cache_raw_responses():
+    prev_urls = set()
+    cache = DiskCache("tests/__pycache__/diskcache-raw")
+    await cache.clear()
+    async with CDragonClient(
+        default_params={"patch": "latest", "locale": "default"},
+        middlewares=[
+            json_response_middleware(),
+            cache_middleware(cache, [
+                (lambda inv: inv.invoker.__name__ == "get_lol_v1_items", 200),
+            ]),
+            detect_cache_expire_middleware(prev_urls),
+            http_error_middleware(),
+        ]
+    ) as client:
+        items = await client.get_lol_v1_items()
+        assert items == await client.get_lol_v1_items()
+        assert isinstance(await cache.get(f"GET {client.base_url}/latest/plugins/rcp-be-lol-game-data/global/default/v1/items.json"), CachedResponse)
+
+
+@async_to_sync()
+async def test_disk_cache_codec():
+    cache = DiskCache("tests/__pycache__/diskcache-codec", codec=ZlibCodec())
+    await cache.clear()
+    match = {"metadata": {"matchId": "NA1_0"}, "info": {"participants": [{"championName": "Yone", "kills": i % 10} for i in range(100)]}}
+    await cache.set("small", {"id": 777}, 60)
+    await cache.set("large", match, 60)
+    assert await cache.get("small") == {"id": 777}
+    assert await cache.get("large") == match
+    assert len(cache.cache.get("large")) < len(cache.serializer.dumps(match)) / 2
+
+
+@async_to_sync()
+async def test_sqlite_cache():
+    cache = SQLiteCache("tests/__pycache__/sqlitecache.sqlite3", vacuum_interval=1)
+    await cache.clear()
+    with contextlib.closing(sqlite3.connect(cache.path)) as connection:
+        assert connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2 # incremental
+    for i in range(2000):
+        await cache.set(f"match:{i}", {"id": i}, 60 if i % 2 else 0.5)
+    assert await cache.get("match:0") == {"id": 0} # queued
+    await cache.flush()
+    assert await cache.get("match:1") == {"id": 1} # committed
+    await cache.set("summary", [{"id": 777}], float("inf"))
+    await asyncio.sleep(1.5)
+    try:
+        await cache.get("match:0")
+        assert False, "Expected exception"
+    except KeyError:
+        assert True
+    _, ttl = await cache.get_with_ttl("summary")
+    assert ttl == float("inf")
+    value = {"id": 777}
+    await cache.set("mutated", value, 60)
+    value["id"] = 0
+    assert await cache.get("mutated") == {"id": 777} # serialized on set
+    await cache.close()
+
+    cache = SQLiteCache("tests/__pycache__/sqlitecache.sqlite3", max_queued=10)
+    for i in range(100):
+        await cache.set(f"match:{i}", {"id": i}, 60)
+        assert cache._queue.qsize() <= 10
+    assert await cache.get_many(["match:0", "match:99"]) == {"match:0": {"id": 0}, "match:99": {"id": 99}}
+    await cache.close()
+
+
+@async_to_sync()
+async def test_cache_batch_operations():
+    for cache in (
+        MemoryCache(),
+        DiskCache("tests/__pycache__/diskcache-batch"),
+        SQLiteCache("tests/__pycache__/sqlitecache-batch.sqlite3"),
+        TieredCache(MemoryCache(max_entries=10), DiskCache("tests/__pycache__/diskcache-batch-tiered")),
+    ):
+        await cache.clear()
+        await cache.set_many({f"match:{i}": {"id": i} for i in range(20)}, 60)
+        values = await cache.get_many([f"match:{i}" for i in range(0, 40, 2)])
+        assert values == {f"match:{i}": {"id": i} for i in range(0, 20, 2)}
+        await cache.delete_many([f"match:{i}" for i in range(10)])
+        assert len(await cache.get_many([f"match:{i}" for i in range(20)])) == 10
+        entries = await cache.get_many_with_ttl(["match:0", "match:10"])
+        assert list(entries) == ["match:10"] and entries["match:10"][0] == {"id": 10}
+        assert 0 < entries["match:10"][1] <= 60
+        await cache.delete("match:10")
+        assert await cache.get_many(["match:10", "match:11"]) == {"match:11": {"id": 11}}
+
+
+def _shared_memory_cache_child(path: str):
+    cache = SharedMemoryCache(path)
+    asyncio.run(cache.set(f"pid{os.getpid()}", CachedResponse("GET", "/", 200, "OK", {}, b"x" * 2048), 60))
+    cache.close()
+
+
+@async_to_sync()
+async def test_shared_memory_cache():
+    path = os.path.join(tempfile.mkdtemp(), "pulsefire.cache")
+    cache = SharedMemoryCache(path, max_bytes=1024**2, max_entries=100)
+    for i in range(1000):
+        await cache.set(f"key{i}", os.urandom(i * 10), 60)
+    assert len(cache) <= 100
+    assert cache.bytes_used <= 1024**2
+    assert await cache.get("key999") == (await cache.get_many(["key999"]))["key999"]
+    await cache.set("expired", 1, 0.01)
+    await asyncio.sleep(0.02)
+    assert await cache.get_many(["expired"]) == {}
+    await cache.delete_many(["key999"])
+    assert await cache.get_many(["key999"]) == {}
+    await cache.clear()
+    assert len(cache) == 0 and cache.bytes_used == 0
+
+    fd = os.open(path, os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    task = asyncio.create_task(cache.set("contended", 1, 60))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+    await task
+    assert await cache.get("contended") == 1
+
+    unbounded = SharedMemoryCache(os.path.join(tempfile.mkdtemp(), "pulsefire.cache"), max_bytes=1024**2, max_entries=0)
+    await unbounded.set("a", b"v", 10)
+    await unbounded.set("b", b"v", 10)
+    assert len(unbounded) == 1 and await unbounded.get("b") == b"v"
+    unbounded.close()
+
+    large = SharedMemoryCache(os.path.join(tempfile.mkdtemp(), "pulsefire.cache"), max_bytes=8 * 1024**2)
+    await large.set("tft", b"a" * 2_000_000, 60)
+    assert await large.get("tft") == b"a" * 2_000_000 # spans pages
+    await large.set("tft", {"b": "b" * 3_000_000}, 60)
+    assert (await large.get("tft"))["b"] == "b" * 3_000_000
+    await large.set("tft", b"c" * 9 * 1024**2, 60) # larger than the cache, not cached
+    assert (await large.get("tft"))["b"] == "b" * 3_000_000
+    for i in range(200):
+        await large.set(f"small{i}", os.urandom(i * 100), 60)
+    for i in range(10):
+        await large.set(f"large{i}", bytes([i]) * 1_500_000, 60)
+        assert await large.get(f"large{i}") == bytes([i]) * 1_500_000
+    assert large.bytes_used <= 8 * 1024**2
+    await large.delete_many([f"large{i}" for i in range(10)])
+    await large.set("tft", b"d" * 7 * 1024**2, 60)
+    assert await large.get("tft") == b"d" * 7 * 1024**2
+    large.close()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_shared_memory_cache_child, args=(path,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    values = await cache.get_many([f"pid{process.pid}" for process in processes])
+    assert len(values) == 4
+    assert all(value.body == b"x" * 2048 for value in values.values())
+    cache.close()
+
+
+@async_to_sync()
+async def test_proxy_cache():
+    popen = subprocess.Popen(f'python -c "{CACHE_SERVER_SCRIPT}"', shell=os.name == "posix")
+    try:
+        await asyncio.sleep(1)
+        cache = ProxyCache("http://127.0.0.1:12228", secret="sAmPLesECReT")
+        await cache.set("a", {"id": 1}, 60)
+        await cache.set_many({"b": [1, 2], "c": b"\x00" * 4096, "d": "infinite"}, math.inf)
+        assert await cache.get("a") == {"id": 1}
+        value, ttl = await cache.get_with_ttl("a")
+        assert value == {"id": 1} and 0 < ttl <= 60
+        assert (await cache.get_with_ttl("d"))[1] == math.inf
+        assert await cache.get_many(["a", "b", "c", "missing"]) == {"a": {"id": 1}, "b": [1, 2], "c": b"\x00" * 4096}
+        await cache.delete_many(["a", "missing"])
+        try:
+            await cache.get("a")
+            assert False, "Expected exception"
+        except KeyError:
+            assert True
+        await cache.clear()
+        assert await cache.get_many(["b", "c", "d"]) == {}
+        await cache.close()
+
+        unauthorized = ProxyCache("http://127.0.0.1:12228")
+        try:
+            await unauthorized.get_many(["b"])
+            assert False, "Expected exception"
+        except aiohttp.ClientResponseError as e:
+            assert e.status == 401
+        await unauthorized.close()
+    finally:
+        popen.terminate()
+
+
+@async_to_sync()
+async def test_proxy_cache_undeletable():
+    popen = subprocess.Popen(f'python -c "{UNDELETABLE_CACHE_SERVER_SCRIPT}"', shell=os.name == "posix")
+    try:
+        await asyncio.sleep(1)
+        cache = ProxyCache("http://127.0.0.1:12229")
+        await cache.set("a", {"id": 1}, 60)
+        try:
+            await cache.delete("a")
+            assert False, "Expected exception"
+        except NotImplementedError:
+            assert True
+        assert await cache.get("a") == {"id": 1}
+        await cache.close()
+    finally:
+        popen.terminate()
+        if os.name == "posix":
+            subprocess.run("kill -9 $(sudo lsof -t -i:12229)", shell=True)
@@ -0,0 +1,85 @@
+import urllib.parse
+
+from pulsefire.clients import BaseClient
+from pulsefire.functools import async_to_sync
+from pulsefire.invocation import Invocation, URLTemplate
+
+from tests import short_circuit_middleware
+
+
+class PlanClient(BaseClient):
+
+    def __init__(self) -> None:
+        super().__init__(
+            base_url="https://{region}.plan.pulsefire.dev",
+            default_params={"region": "na1", "unused": ...},
+            default_queries={"source": "test"},
+            middlewares=[short_circuit_middleware()],
+        )
+
+    async def get_match(self, *, region: str = ..., id: str = ..., queries: dict = {"full": 1}):
+        return await self.invoke("GET", "/matches/{id}")
+
+    async def get_matches(self, *, region: str = ..., ids: list[str] = ...):
+        path = "/matches/" + ",".join(ids)
+        return await self.invoke("GET", path)
+
+
+def test_invocation_url():
+    params = {"region": "na1", "puuid": "a-b_c", "queries": {"start": 0, "count": 100, "queue": "4 20"}}
+    invocation = Invocation("GET", "https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids", params)
+    assert invocation.url == (
+        "https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids".format(**params)
+        + "?" + urllib.parse.urlencode(params["queries"])
+    )
+    assert invocation.url is invocation.url
+    invocation.params = {**params, "region": "euw1"}
+    assert invocation.url.startswith("https://euw1.")
+    assert URLTemplate.compile(invocation.urlformat) is URLTemplate.compile(invocation.urlformat)
+    assert Invocation("GET", "/{patch}/set{set}/{locale}/data/set{set}-{locale}.json", {
+        "patch": "latest", "set": 8, "locale": "en_us"
+    }).url == "/latest/set8/en_us/data/set8-en_us.json"
+    try:
+        Invocation("GET", "/{id}", {}).url
+        assert False, "Expected exception"
+    except KeyError:
+        assert True
+
+
+def test_invocation_uid():
+    invocation = Invocation("GET", "/{id}", {"id": 0})
+    assert invocation.uid == invocation.uid
+    assert invocation.uid != Invocation("GET", "/{id}", {"id": 0}).uid
+    assert Invocation("GET", "/{id}", {"id": 0}, uid="sample").uid == "sample"
+    assert Invocation("GET", "/{id}", {"id": 0}).seq > invocation.seq
+
+
+@async_to_sync()
+async def test_invocation_plans():
+    client = PlanClient()
+    original = PlanClient.get_match
+    for _ in range(2):
+        invocation: Invocation = await client.get_match(id="1")
+        assert invocation.url == "https://na1.plan.pulsefire.dev/matches/1?source=test&full=1"
+        assert invocation.params["headers"] == {} and "unused" not in invocation.params
+        assert invocation.invoker.__name__ == "get_match" and invocation.invoker.__self__ is client
+    assert PlanClient.get_match is original
+    invocation = await client.get_match(region="euw1", id="2", queries={})
+    assert invocation.url == "https://euw1.plan.pulsefire.dev/matches/2?source=test"
+    for _ in range(2):
+        invocation = await client.get_matches(ids=["1", "2"])
+        assert invocation.url == "https://na1.plan.pulsefire.dev/matches/1,2?source=test"
+        assert invocation.params["path"] == "/matches/1,2" # Locals keep being grabbed
+
+    invokes = []
+
+    class LoggingPlanClient(PlanClient):
+        async def invoke(self, method, path_or_url):
+            invokes.append(path_or_url)
+            return path_or_url
+
+    logging_client = LoggingPlanClient()
+    for _ in range(2):
+        await client.get_match(id="3")
+        assert await logging_client.get_match(id="3") == "/matches/{id}"
+    assert invokes == ["/matches/{id}"] * 2 # Overrides of invoke are never skipped
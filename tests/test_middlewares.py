@@ -0,0 +1,339 @@
+import asyncio
+import collections
+
+import aiohttp
+from aiohttp import web
+
+from pulsefire.caches import CachedResponse, MemoryCache, SQLiteCache
+from pulsefire.functools import async_to_sync
+from pulsefire.middlewares import (
+    cache_control_ttl,
+    canonical_cache_key,
+    cache_middleware,
+    cdragon_patch_resolver,
+    coalesce_middleware,
+    ddragon_patch_resolver,
+    json_response_middleware,
+    negative_cache_middleware,
+    patch_resolver_middleware,
+    http_error_middleware,
+    revalidation_middleware,
+    MiddlewareCallable,
+    Invocation,
+    _default_patch_resolver,
+)
+from pulsefire.taskgroups import TaskGroup
+
+from tests import MockClient, mock_response_middleware
+
+
+@async_to_sync()
+async def test_coalesce_middleware():
+    requests = []
+    counter = collections.Counter()
+    client = MockClient(
+        middlewares=[
+            coalesce_middleware(counter),
+            mock_response_middleware(requests),
+        ]
+    )
+    champions = await asyncio.gather(*[client.get_champion(id=777) for _ in range(10)])
+    assert len(requests) == 1 and counter["coalesced"] == 9
+    assert all(champion["id"] == 777 for champion in champions)
+    results = await asyncio.gather(*[client.get_champion(id=0) for _ in range(5)], return_exceptions=True)
+    assert len(requests) == 2 and counter["coalesced"] == 13
+    assert all(isinstance(result, ValueError) for result in results)
+    await client.get_champion(id=777)
+    assert len(requests) == 3
+    tasks = [asyncio.create_task(client.get_champion(id=5)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    tasks[0].cancel() # waiting invocations retry
+    assert await asyncio.gather(*tasks[1:]) == [{"id": 5}] * 2
+    assert tasks[0].cancelled()
+    assert len(requests) == 5 and counter["coalesced"] == 14
+
+
+@async_to_sync()
+async def test_cache_middleware_stampede():
+    requests = []
+    cache = MemoryCache()
+    client = MockClient(
+        middlewares=[
+            cache_middleware(cache, [
+                (lambda inv: inv.params["id"] == 1, 0.5),
+                (lambda inv: inv.params["id"] == 2, 0.5, 60),
+            ]),
+            mock_response_middleware(requests),
+        ]
+    )
+    await asyncio.gather(*[client.get_champion(id=1) for _ in range(10)])
+    assert len(requests) == 1
+    await asyncio.gather(*[client.get_champion(id=2) for _ in range(10)])
+    assert len(requests) == 2
+    await asyncio.sleep(0.6)
+    await asyncio.gather(*[client.get_champion(id=1) for _ in range(10)]) # expired
+    assert len(requests) == 3
+    await asyncio.gather(*[client.get_champion(id=2) for _ in range(10)]) # stale, refreshing
+    assert len(requests) == 4
+    assert requests[-1].endswith("/2")
+    await asyncio.sleep(0.2)
+    await asyncio.gather(*[client.get_champion(id=2) for _ in range(10)]) # refreshed
+    assert len(requests) == 4
+    assert await cache.get("GET https://mock.pulsefire.dev/champions/2") == {"id": 2} # stored as is
+
+
+@async_to_sync()
+async def test_cache_middleware_batch_lookups():
+    requests = []
+    cache = SQLiteCache("tests/__pycache__/sqlitecache-batch.sqlite3")
+    await cache.clear()
+    await cache.set_many({f"GET https://mock.pulsefire.dev/champions/{id}": {"id": id} for id in range(50)}, 60)
+    lookups = []
+    get_many_with_ttl = cache.get_many_with_ttl
+    async def tracked_get_many_with_ttl(keys):
+        lookups.append(len(keys))
+        return await get_many_with_ttl(keys)
+    cache.get_many_with_ttl = tracked_get_many_with_ttl
+    client = MockClient(
+        middlewares=[
+            cache_middleware(cache, [(lambda inv: True, 60)], batch_lookups=True),
+            mock_response_middleware(requests),
+        ]
+    )
+    async with TaskGroup(asyncio.Semaphore(100)) as tg:
+        for id in range(100):
+            await tg.create_task(client.get_champion(id=id))
+    assert sorted(champion["id"] for champion in tg.results()) == list(range(100))
+    assert lookups == [100]
+    assert len(requests) == 50
+    await cache.close()
+
+
+@async_to_sync()
+async def test_revalidation_middleware():
+    requests = []
+    modified_since = []
+    version = {"etag": '"v1"', "modified": "Mon, 07 Oct 2024 10:00:00 GMT"}
+
+    def mock_cdn_middleware(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            headers = invocation.params.get("headers", {})
+            requests.append(headers.get("If-None-Match"))
+            modified_since.append(headers.get("If-Modified-Since"))
+            if headers.get("If-None-Match") == version["etag"]:
+                return CachedResponse("GET", invocation.url, 304, "Not Modified", {"Last-Modified": version["modified"]}, b"")
+            body = f'{{"etag": {version["etag"]}}}'.encode()
+            return CachedResponse("GET", invocation.url, 200, "OK", {"ETag": version["etag"]}, body)
+        return middleware
+
+    cache = MemoryCache()
+    client = MockClient(
+        middlewares=[
+            cache_middleware(cache, [(lambda inv: inv.params["id"] == 3, 60)]),
+            json_response_middleware(),
+            http_error_middleware(0),
+            revalidation_middleware(cache, [
+                (lambda inv: inv.params["id"] in (1, 3), 0.2),
+            ]),
+            mock_cdn_middleware,
+        ]
+    )
+    assert await client.get_champion(id=1) == {"etag": "v1"}
+    assert await client.get_champion(id=1) == {"etag": "v1"} # fresh
+    assert requests == [None]
+    await asyncio.sleep(0.3)
+    assert await client.get_champion(id=1) == {"etag": "v1"} # not modified
+    assert await client.get_champion(id=1) == {"etag": "v1"} # fresh again
+    assert requests == [None, '"v1"']
+    await asyncio.sleep(0.3)
+    version["etag"] = '"v2"'
+    assert await client.get_champion(id=1) == {"etag": "v2"} # modified
+    assert requests == [None, '"v1"', '"v1"']
+    assert modified_since == [None, None, version["modified"]] # refreshed by the 304
+    await client.get_champion(id=2)
+    await client.get_champion(id=2) # bypassed
+    assert requests[-2:] == [None, None]
+    assert await client.get_champion(id=3) == {"etag": "v2"}
+    assert await client.get_champion(id=3) == {"etag": "v2"} # shared cache, separate keys
+    assert len(requests) == 6
+    assert (await cache.get("rv:GET https://mock.pulsefire.dev/champions/3")).response.status == 200
+
+
+@async_to_sync()
+async def test_cache_middleware_cache_control():
+    requests = []
+    cache_headers = {1: {"Cache-Control": "public, max-age=60", "Age": "30"}, 2: {"Cache-Control": "no-store"}, 3: {}}
+
+    def mock_headers_middleware(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            requests.append(invocation.url)
+            headers = cache_headers[invocation.params["id"]]
+            invocation.response = CachedResponse("GET", invocation.url, 200, "OK", headers, b"")
+            return {"id": invocation.params["id"]}
+        return middleware
+
+    cache = MemoryCache()
+    client = MockClient(
+        middlewares=[
+            cache_middleware(cache, [(lambda inv: True, cache_control_ttl(20, default=10))]),
+            mock_headers_middleware,
+        ]
+    )
+    for id in (1, 2, 3, 1, 2, 3):
+        assert await client.get_champion(id=id) == {"id": id}
+    assert len(requests) == 4 and requests[-1].endswith("/2")
+    assert 19 < (await cache.get_with_ttl("GET https://mock.pulsefire.dev/champions/1"))[1] <= 20
+    assert 9 < (await cache.get_with_ttl("GET https://mock.pulsefire.dev/champions/3"))[1] <= 10
+
+
+@async_to_sync()
+async def test_cache_middleware_indexed_rules():
+    requests = []
+
+    client = MockClient(
+        middlewares=[
+            cache_middleware(MemoryCache(), {"get_champion": 60}),
+            mock_response_middleware(requests, 0),
+        ]
+    )
+    for _ in range(3):
+        await client.get_champion(id=1)
+        await client.get_item(id=1)
+    assert len(requests) == 4
+    assert sum(url.endswith("/items/1") for url in requests) == 3
+
+
+@async_to_sync()
+async def test_patch_resolver_middleware():
+    requests = []
+    resolutions = []
+
+    async def resolver(invocation: Invocation, base_url: str):
+        resolutions.append(base_url)
+        await asyncio.sleep(0.05)
+        if len(resolutions) == 3:
+            raise ValueError("unavailable")
+        return f"14.{len(resolutions)}"
+
+    def mock_patch_middleware(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            requests.append(invocation.url)
+            return invocation.params["patch"]
+        return middleware
+
+    client = MockClient(middlewares=[patch_resolver_middleware(resolver, 0.2), mock_patch_middleware])
+    assert await asyncio.gather(*[client.get_items() for _ in range(5)]) == ["14.1"] * 5
+    assert resolutions == ["https://mock.pulsefire.dev"]
+    assert requests[0] == "https://mock.pulsefire.dev/14.1/items.json"
+    assert await client.get_items(patch="13.24") == "13.24"
+    await asyncio.sleep(0.25)
+    assert await client.get_items() == "14.2"
+    await asyncio.sleep(0.25)
+    assert await client.get_items() == "14.2" # resolution failed, kept last patch
+    assert len(resolutions) == 3
+
+    failures = []
+
+    async def failing_resolver(invocation: Invocation, base_url: str):
+        failures.append(base_url)
+        raise ValueError("unavailable")
+
+    client = MockClient(middlewares=[patch_resolver_middleware(failing_resolver, failure_ttl=0.1), mock_patch_middleware])
+    assert await client.get_items() == "latest" # first resolution failed, alias kept
+    assert await client.get_items() == "latest"
+    assert len(failures) == 1
+    await asyncio.sleep(0.15)
+    assert await client.get_items() == "latest"
+    assert len(failures) == 2
+
+    client = MockClient(middlewares=[patch_resolver_middleware(), mock_patch_middleware])
+    assert await client.get_items() == "latest" # default resolvers are scoped to CDragon and DDragon hosts
+    assert _default_patch_resolver("https://raw.communitydragon.org/latest") is cdragon_patch_resolver
+    assert _default_patch_resolver("https://ddragon.leagueoflegends.com/cdn") is ddragon_patch_resolver
+    assert _default_patch_resolver("https://dd.b.pvp.net") is None
+
+
+@async_to_sync()
+async def test_ddragon_patch_resolver():
+    async def versions(request: web.Request):
+        return web.json_response(["14.20.1", "14.19.1"])
+
+    app = web.Application()
+    app.router.add_get("/api/versions.json", versions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 12230).start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            invocation = Invocation("GET", "http://127.0.0.1:12230/cdn/{patch}/data/en_US/item.json", {"patch": "latest"}, session)
+            assert await ddragon_patch_resolver(invocation, "http://127.0.0.1:12230/cdn") == "14.20.1"
+    finally:
+        await runner.cleanup()
+
+
+@async_to_sync()
+async def test_negative_cache_middleware():
+    requests = []
+    counter = collections.Counter()
+
+    def mock_not_found_middleware(next: MiddlewareCallable):
+        async def middleware(invocation: Invocation):
+            requests.append(invocation.url)
+            if invocation.params["id"] < 0:
+                return CachedResponse("GET", invocation.url, 404, "Not Found", {}, b"").raise_for_status()
+            if invocation.params["id"] == 0:
+                return CachedResponse("GET", invocation.url, 403, "Forbidden", {}, b"").raise_for_status()
+            if invocation.params["id"] == 2:
+                return [2, "Two"]
+            return {"id": invocation.params["id"]}
+        return middleware
+
+    cache = MemoryCache()
+    client = MockClient(
+        middlewares=[
+            negative_cache_middleware(cache, [(lambda inv: True, 0.2)], counter),
+            cache_middleware(cache, [(lambda inv: inv.params["id"] == 2, 60)]),
+            mock_not_found_middleware,
+        ]
+    )
+    for _ in range(3):
+        try:
+            await client.get_champion(id=-1)
+            assert False, "Expected exception"
+        except aiohttp.ClientResponseError as e:
+            assert e.status == 404 and e.message == "Not Found"
+            assert str(e.request_info.url).endswith("/champions/-1")
+        assert await client.get_champion(id=1) == {"id": 1}
+    assert len(requests) == 4 and counter["negative_cached"] == 2
+    for _ in range(2):
+        try:
+            await client.get_champion(id=0)
+            assert False, "Expected exception"
+        except aiohttp.ClientResponseError as e:
+            assert e.status == 403
+    assert len(requests) == 6
+    await asyncio.sleep(0.25)
+    try:
+        await client.get_champion(id=-1)
+        assert False, "Expected exception"
+    except aiohttp.ClientResponseError as e:
+        assert e.status == 404
+    assert len(requests) == 7 and counter["negative_cached"] == 2
+    for _ in range(2):
+        assert await client.get_champion(id=2) == [2, "Two"] # shared cache, not mistaken for an error
+    assert len(requests) == 8 and counter["negative_cached"] == 2
+
+
+def test_canonical_cache_key():
+    key = canonical_cache_key(["Accept-Language"], max_length=120)
+    invocation = Invocation("GET", "https://NA1.api.riotgames.com/lol/{id}", {
+        "id": "AbC", "queries": {"start": 0, "count": 100}, "headers": {"X-Riot-Token": "secret", "accept-language": "ko"},
+    })
+    reordered = Invocation("GET", "https://na1.api.riotgames.com/lol/{id}", {
+        "id": "AbC", "queries": {"count": 100, "start": 0}, "headers": {"Accept-Language": "ko"},
+    })
+    assert key(invocation) == key(reordered) == "GET https://na1.api.riotgames.com/lol/AbC?count=100&start=0\naccept-language: ko"
+    assert key(Invocation("GET", "https://na1.api.riotgames.com/lol/{id}", {"id": "abc"})) != key(reordered)
+    long = Invocation("GET", "https://na1.api.riotgames.com/lol/{id}", {"id": "x" * 200})
+    assert len(key(long)) == len("GET #") + 32
+    assert key(long) == key(Invocation("GET", "https://na1.api.riotgames.com/lol/{id}", {"id": "x" * 200}))
@@ -1,12 +1,16 @@
 import asyncio
+import collections
 import os
 import subprocess
+import time
 
 import aiohttp
 
 from pulsefire.clients import RiotAPIClient
 from pulsefire.functools import async_to_sync
+from pulsefire.invocation import Priority, prioritize
 from pulsefire.middlewares import (
+    Invocation,
     json_response_middleware,
     http_error_middleware,
     rate_limiter_middleware
@@ -14,6 +18,10 @@ from pulsefire.middlewares import (
 from pulsefire.ratelimiters import RiotAPIRateLimiter
 from pulsefire.taskgroups import TaskGroup
 
+from tests import MockClient, mock_riot_api_middleware
+
+
+MOCK_RIOT_API_URL = "https://{region}.mock.pulsefire.dev"
 
 RATELIMITER_PROXY_SCRIPT = (
     "from pulsefire.ratelimiters import RiotAPIRateLimiter;"
@@ -25,6 +33,17 @@ RATELIMITER_PROXY_SECRET_SCRIPT = (
     "RiotAPIRateLimiter().serve(secret='sAmPLesECReT')"
 )
 
+
+class CountingRateLimiter(RiotAPIRateLimiter):
+
+    def __init__(self, counter: collections.Counter, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.counter = counter
+
+    async def acquire(self, invocation: Invocation) -> float:
+        self.counter["acquire"] += 1
+        return await super().acquire(invocation)
+
 @async_to_sync()
 async def test_riot_api_rate_limiter_local():
     async with RiotAPIClient(
@@ -109,3 +128,145 @@ async def test_riot_api_rate_limiter_proxy_secret():
         popen.terminate()
         if os.name == "posix":
             subprocess.run("kill -9 $(sudo lsof -t -i:12227)", shell=True)
+
+
+@async_to_sync()
+async def test_riot_api_rate_limiter_wakeups():
+    counter = collections.Counter()
+    rate_limiter = CountingRateLimiter(counter)
+    client = MockClient(
+        base_url=MOCK_RIOT_API_URL,
+        middlewares=[
+            rate_limiter_middleware(rate_limiter),
+            mock_riot_api_middleware(counter, (50, 1)),
+        ]
+    )
+    started = time.time()
+    await asyncio.gather(*[client.get_match(region="wakeups", id=str(i)) for i in range(150)])
+    assert counter["requests"] == 150 and counter["429"] == 0
+    assert counter["acquire"] <= 2 * 150 + 5 # parked, not polling
+    assert time.time() - started < 4
+    invocation = Invocation("GET", MOCK_RIOT_API_URL + "/matches/{id}", {"region": "wakeups", "id": "0"})
+    assert not any(bucket.waiters for bucket in rate_limiter._plan(invocation))
+
+
+@async_to_sync()
+async def test_riot_api_rate_limiter_priority():
+    counter = collections.Counter()
+    completed = []
+    client = MockClient(
+        base_url=MOCK_RIOT_API_URL,
+        middlewares=[
+            rate_limiter_middleware(RiotAPIRateLimiter()),
+            mock_riot_api_middleware(counter, (40, 1)),
+        ]
+    )
+
+    async def get_match(id: str):
+        await client.get_match(region="priority", id=id)
+        completed.append(id)
+
+    async with TaskGroup() as tg:
+        with prioritize(Priority.BACKFILL):
+            for i in range(160):
+                await tg.create_task(get_match(f"backfill{i}"))
+        await asyncio.sleep(0.2)
+        with prioritize(Priority.INTERACTIVE):
+            for i in range(20):
+                await tg.create_task(get_match(f"interactive{i}"))
+    assert counter["429"] == 0
+    assert max(completed.index(f"interactive{i}") for i in range(20)) < 80
+    backfills = [int(id.removeprefix("backfill")) for id in completed if id.startswith("backfill")]
+    assert backfills[40:] == sorted(backfills[40:]) # FIFO once parked
+
+
+@async_to_sync()
+async def test_riot_api_rate_limiter_parking():
+    counter = collections.Counter()
+    completed = {}
+    client = MockClient(
+        base_url=MOCK_RIOT_API_URL,
+        middlewares=[
+            rate_limiter_middleware(RiotAPIRateLimiter()),
+            mock_riot_api_middleware(counter, (10, 1)),
+        ]
+    )
+
+    async def get_match(region: str, id: str):
+        await client.get_match(region=region, id=id)
+        completed[id] = time.time()
+
+    started = time.time()
+    async with TaskGroup(asyncio.Semaphore(10), parking=asyncio.Semaphore(100)) as tg:
+        for i in range(30):
+            await tg.create_task(get_match("parking1", f"parking1-{i}"))
+        for i in range(10):
+            await tg.create_task(get_match("parking2", f"parking2-{i}"))
+    assert counter["429"] == 0 and len(completed) == 40
+    # Tasks waiting for the exhausted region do not hold slots required by the other region
+    assert max(completed[f"parking2-{i}"] for i in range(10)) - started < 1
+    assert max(completed.values()) - started > 2
+
+
+@async_to_sync()
+async def test_riot_api_rate_limiter_cold_start():
+    counter = collections.Counter()
+    mock_middleware = mock_riot_api_middleware(counter, (20, 1), latency=0.1)
+    rate_limiter = RiotAPIRateLimiter(shared=False, limits={
+        "app": "20:1",
+        "https://{region}.mock.pulsefire.dev/matches/{id}": "10000:10",
+    })
+    client = MockClient(base_url=MOCK_RIOT_API_URL, middlewares=[rate_limiter_middleware(rate_limiter), mock_middleware])
+    unlimited_client = MockClient(base_url=MOCK_RIOT_API_URL, middlewares=[mock_middleware])
+
+    # Seeded buckets burst without pinging first
+    started = time.time()
+    await asyncio.gather(*[client.get_match(region="coldstart1", id=str(i)) for i in range(10)])
+    assert time.time() - started < 0.18
+    assert counter["requests"] == 10 and counter["429"] == 0
+
+    # The burst is reconciled against the counts of requests made elsewhere in the window
+    await asyncio.gather(*[unlimited_client.get_match(region="coldstart2", id=str(i)) for i in range(5)])
+    started = time.time()
+    await asyncio.gather(*[client.get_match(region="coldstart2", id=str(i)) for i in range(20)])
+    assert counter["requests"] == 35 and counter["429"] == 0
+    assert time.time() - started > 1
+
+    assert rate_limiter.export_limits()["https://{region}.mock.pulsefire.dev/matches/{id}"] == "10000:10"
+
+    # Seeded and learned limits are not shared with other rate limiters
+    other_rate_limiter = RiotAPIRateLimiter()
+    invocation = Invocation("GET", "https://{region}.mock.pulsefire.dev/matches/{id}", {"region": "coldstart1", "id": "0"})
+    assert await other_rate_limiter.acquire(invocation) == -1 # pinging, limits unknown
+
+
+@async_to_sync()
+async def test_riot_api_rate_limiter_shared():
+    urlformat = "https://{region}.mock.pulsefire.dev/shared/{id}"
+    invocation = Invocation("GET", urlformat, {"region": "shared", "id": "0"})
+    headers = {
+        "X-App-Rate-Limit": "20:1,100:120",
+        "X-App-Rate-Limit-Count": "1:1,1:120",
+        "X-Method-Rate-Limit": "2000:10",
+        "X-Method-Rate-Limit-Count": "1:10",
+    }
+
+    # Buckets are shared by the rate limiters of the process
+    rate_limiter = RiotAPIRateLimiter()
+    assert await rate_limiter.acquire(invocation) == -1
+    assert await RiotAPIRateLimiter().acquire(invocation) > 0 # pinged by the other rate limiter
+    assert await RiotAPIRateLimiter(shared=False).acquire(invocation) == -1
+    await rate_limiter.synchronize(invocation, headers)
+    assert await RiotAPIRateLimiter().acquire(invocation) == 0
+    assert invocation._uid is None # tracked by seq, no uid generated
+    assert RiotAPIRateLimiter().export_limits()[urlformat] == "2000:10"
+
+    # Seeded limits are shared too, conflicting seeds are rejected
+    RiotAPIRateLimiter(limits={urlformat + "?seeded": "500:10"})
+    RiotAPIRateLimiter(limits={urlformat + "?seeded": "500:10"})
+    RiotAPIRateLimiter(shared=False, limits={urlformat + "?seeded": "100:10"})
+    try:
+        RiotAPIRateLimiter(limits={urlformat + "?seeded": "100:10"})
+        assert False, "Expected exception"
+    except ValueError:
+        assert True